@@ -1,54 +1,62 @@
 import math
-import logging
+import heapq
+import mmap as mmap_module
+import os
+import pickle
+import struct
+import sys
+import tempfile
+import threading
+from contextlib import nullcontext
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
+from operator import add
+from array import array
 from typing import Any
-from collections.abc import Iterable
+from collections import OrderedDict
+from collections.abc import Callable, Iterable, Iterator
 from dataclasses import dataclass, field
 
-logging.basicConfig(level=logging.DEBUG)
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
 Position = list[float] | Iterable[float]
 
-class Point:
-    def __init__(self, coordinates : Position) -> None:
-        self.__coordinates : list[float] = []
-        if (type(coordinates) is list):
-            self.__coordinates = coordinates.copy()
-        else:
-            for c in coordinates:
-                self.__coordinates.append(c)
-        return
+class Point(tuple):
+    """
+    Координаты точки
+    Хранятся непосредственно в кортеже: без словаря атрибутов и без отдельного списка
+    """
+    __slots__ = ()
 
-    def __str__(self) -> str:
-        return f"{self.__coordinates}"
+    def __new__(cls, coordinates : Position) -> "Point":
+        return tuple.__new__(cls, coordinates)
 
-    def __getitem__(self, key : int) -> float:
-        return self.__coordinates[key]
+    def __str__(self) -> str:
+        return f"{list(self)}"
 
     def dimension(self) -> int:
-        return len(self.__coordinates)
+        return len(self)
 
     def middle(self, other : "Point") -> "Point":
-        c = []
-        assert len(self.__coordinates) == len(other.__coordinates)
-        for i in range(len(self.__coordinates)):
-            c.append((self.__coordinates[i] + other.__coordinates[i])/2)
-        return Point(c)
+        assert len(self) == len(other)
+        return Point([(a + b)/2 for a, b in zip(self, other)])
 
     def distance2(self, other : "Point") -> float:
         d : float = 0.0
-        assert len(self.__coordinates) == len(other.__coordinates)
-        for i in range(len(self.__coordinates)):
-            d += (self.__coordinates[i] - other.__coordinates[i])**2
+        assert len(self) == len(other)
+        for a, b in zip(self, other):
+            d += (a - b)*(a - b)
         return d
 
     def distance(self, other : "Point") -> float:
-        d : float = 0.0
-        assert len(self.__coordinates) == len(other.__coordinates)
-        for i in range(len(self.__coordinates)):
-            d += (self.__coordinates[i] - other.__coordinates[i])**2
-        return math.sqrt(d)
+        return math.sqrt(self.distance2(other))
 
 class Direction:
+    __slots__ = ("__dir",)
+
     def __init__(self, dir : int) -> None:
         self.__dir = dir
         return
@@ -70,15 +78,17 @@ class Direction:
         return Point(c)
 
 class Cuboid:
+    __slots__ = ("__p_min", "__p_mid", "__p_max")
+
     def __init__(self, p1 : Point, p2 : Point) -> None:
         assert p1.dimension() == p2.dimension()
         c_min : list[float] = []
         c_mid : list[float] = []
         c_max : list[float] = []
-        for i in range(p1.dimension()):
-            c_min.append(min(p1[i], p2[i]))
-            c_max.append(max(p1[i], p2[i]))
-            c_mid.append((p1[i]+p2[i])/2)
+        for a, b in zip(p1, p2):
+            c_min.append(min(a, b))
+            c_max.append(max(a, b))
+            c_mid.append((a + b)/2)
         self.__p_min = Point(c_min)
         self.__p_mid = Point(c_mid)
         self.__p_max = Point(c_max)
@@ -102,64 +112,173 @@ class Cuboid:
     def point_direction(self, p : Point) -> Direction:
         d : int = 0
         n : int = 1
-        for i in range(self.dimension()):
-            assert p[i] < self.__p_max[i] and p[i] >= self.__p_min[i]
-            if (p[i] >= self.__p_mid[i]):
+        for c, c_min, c_mid, c_max in zip(p, self.__p_min, self.__p_mid, self.__p_max):
+            assert c < c_max and c >= c_min
+            if (c >= c_mid):
                 d += n
-            n *= 2
+            n += n
         return Direction(d)
 
+    def partition(self, contents : list["Content"]) -> dict[int, list["Content"]]:
+        """
+        Разбить данные по направлениям от центра области (ключ - Direction.hash())
+        Все точки должны лежать внутри области
+        """
+        groups : dict[int, list[Content]] = {}
+        mid = [(2**i, m) for i, m in enumerate(self.__p_mid)]
+        for c in contents:
+            d : int = 0
+            for x, (n, m) in zip(c.point(), mid):
+                if (x >= m):
+                    d += n
+            group = groups.get(d)
+            if (group is None):
+                groups[d] = [c]
+            else:
+                group.append(c)
+        return groups
+
+    def subarea(self, direction : int) -> "Cuboid":
+        """
+        Часть области в заданном направлении от центра (область подузла)
+        """
+        return Cuboid(Direction(direction).choose_coordinates(self.__p_min, self.__p_max), self.__p_mid)
+
+    def enclosing(self, p : Point) -> tuple["Cuboid", int]:
+        """
+        Область, вдвое большая по каждой оси и продолжающая эту в сторону точки,
+        и направление, в котором в ней лежит эта область
+        Из-за округления эта область может не совпасть в точности с subarea результата
+        """
+        c_min : list[float] = []
+        c_max : list[float] = []
+        d : int = 0
+        n : int = 1
+        for c, c_lo, c_hi in zip(p, self.__p_min, self.__p_max):
+            # целые границы удваивались бы без переполнения и не сравнивались бы с float
+            c_lo = float(c_lo)
+            c_hi = float(c_hi)
+            span = (c_hi - c_lo) or 1.0
+            if (c < c_lo):
+                c_min.append(c_lo - span)
+                c_max.append(c_hi)
+                d += n
+            else:
+                c_min.append(c_lo)
+                c_max.append(c_hi + span)
+            n += n
+        return Cuboid(Point(c_min), Point(c_max)), d
+
+    def same(self, other : "Cuboid") -> bool:
+        """
+        Совпадают ли области в точности
+        """
+        return (self.__p_min == other.__p_min) and (self.__p_max == other.__p_max)
+
     def contains(self, p : Point) -> bool:
         assert self.__p_min.dimension() == p.dimension()
-        for i in range(self.__p_min.dimension()):
-            if (p[i] < self.__p_min[i]):
-                return False
-            if (p[i] >= self.__p_max[i]):
+        for c, c_min, c_max in zip(p, self.__p_min, self.__p_max):
+            if (c < c_min) or (c >= c_max):
                 return False
         return True
 
     def outside_radius(self, point : Point, radius : float) -> bool:
         """
-        Гарантированное нахождение вне радиуса от точки
-        ВНИМАНИЕ, отрицательный результат не гарантирует, что область есть внутри радиуса
+        Лежит ли область целиком вне окрестности точки
         """
-        for i in range(self.__p_min.dimension()):
-            if (self.__p_min[i] > point[i]+radius):
-                return True
-            if (self.__p_max[i] < point[i]-radius):
-                return True
-        return False
+        return self.min_distance2(point) > radius*radius
 
     def intersect_radius(self, point : Point, radius : float) -> bool:
         """
-        Гарантированное вхождение в окрестность точки
-        ВНИМАНИЕ, отрицательный результат не гарантирует, что вся область содержится в окрестности
+        Лежит ли область целиком внутри окрестности точки
         """
-        pass
+        return self.max_distance2(point) <= radius*radius
+
+    def intersects(self, other : "Cuboid") -> bool:
+        """
+        Пересекаются ли области (верхние границы в области не входят)
+        """
+        for c_min, c_max, o_min, o_max in zip(self.__p_min, self.__p_max, other.__p_min, other.__p_max):
+            if (c_min >= o_max) or (o_min >= c_max):
+                return False
+        return True
+
+    def inside(self, other : "Cuboid") -> bool:
+        """
+        Содержится ли область целиком в другой
+        """
+        for c_min, c_max, o_min, o_max in zip(self.__p_min, self.__p_max, other.__p_min, other.__p_max):
+            if (c_min < o_min) or (c_max > o_max):
+                return False
+        return True
+
+    def min_distance2(self, p : Point) -> float:
+        """
+        Квадрат наименьшего расстояния от точки до области
+        """
+        d : float = 0.0
+        for c, c_min, c_max in zip(p, self.__p_min, self.__p_max):
+            if (c < c_min):
+                d += (c_min - c)*(c_min - c)
+            elif (c > c_max):
+                d += (c - c_max)*(c - c_max)
+        return d
+
+    def min_distance2_to(self, other : "Cuboid") -> float:
+        """
+        Квадрат наименьшего расстояния между точками двух областей
+        """
+        d : float = 0.0
+        for c_min, c_max, o_min, o_max in zip(self.__p_min, self.__p_max, other.__p_min, other.__p_max):
+            if (o_min > c_max):
+                d += (o_min - c_max)*(o_min - c_max)
+            elif (c_min > o_max):
+                d += (c_min - o_max)*(c_min - o_max)
+        return d
+
+    def min_distance2_many(self, points : "np.ndarray") -> "np.ndarray":
+        """
+        Квадраты наименьших расстояний до области сразу для массива точек формы (m, d)
+        """
+        below = np.maximum(np.asarray(self.__p_min) - points, 0.0)
+        above = np.maximum(points - np.asarray(self.__p_max), 0.0)
+        d = below + above
+        return np.einsum("ij,ij->i", d, d)
+
+    def max_distance2(self, p : Point) -> float:
+        """
+        Квадрат наибольшего расстояния от точки до области
+        """
+        d : float = 0.0
+        for c, c_min, c_max in zip(p, self.__p_min, self.__p_max):
+            if (c - c_min > c_max - c):
+                d += (c - c_min)*(c - c_min)
+            else:
+                d += (c_max - c)*(c_max - c)
+        return d
 
     def max_distance_from_point(self, p : Point) -> float:
         """
         Наибольшее расстояние от точки
         """
         assert self.__p_min.dimension() == p.dimension()
-        coordinates : list[float] = []
-        for i in range(self.__p_min.dimension()):
-            if (p[i] < self.__p_mid[i]):
-                coordinates.append(self.__p_max[i])
-            else:
-                coordinates.append(self.__p_min[i])
-        v = Point(coordinates)
-        return v.distance(p)
+        return math.sqrt(self.max_distance2(p))
 
 class Path:
+    __slots__ = ("__path",)
+
     def __init__(self, path : list[Direction]) -> None:
         self.__path = path
         return
 
 class Content:
+    __slots__ = ("__point", "__data", "__leaf", "__slot")
+
     def __init__(self, point : Point, data : Any = None) -> None:
         self.__point = point
         self.__data = data
+        self.__leaf : "Node | int | None" = None
+        self.__slot : int = -1
         return
 
     def __str__(self) -> str:
@@ -174,249 +293,3375 @@ class Content:
     def data(self) -> Any:
         return self.__data
 
+    def leaf(self) -> "Node | int | None":
+        """
+        Лист, в котором хранятся данные (у NodeArena - номер листа)
+        """
+        return self.__leaf
+
+    def slot(self) -> int:
+        """
+        Позиция данных в списке листа
+        """
+        return self.__slot
+
+    def locate(self, leaf : "Node | int", slot : int) -> None:
+        """
+        Запомнить лист и позицию в нём, где хранятся данные
+        """
+        self.__leaf = leaf
+        self.__slot = slot
+        return
+
+    def move(self, point : Point) -> None:
+        self.__point = point
+        return
+
 @dataclass
 class ClosestContent:
-    max_distance : float = 0.0
-    content : list[Content] = field(default_factory=list) 
+    """
+    Ограниченная max-куча ближайших данных
+    n - количество ближайших
+    heap - элементы (-квадрат расстояния, -порядковый номер, данные)
+    epsilon - допустимая погрешность: отбрасываются области дальше (n-го найденного)/(1 + epsilon)
+    max_leaves, max_evaluations - бюджет поиска в листьях и вычислениях расстояний (None - без ограничения)
+    leaves, evaluations - израсходованный бюджет
+    stopped2 - квадрат расстояния до ближайшей области, не просмотренной из-за бюджета
+    """
+    n : int = 1
+    heap : list[tuple[float, int, Content]] = field(default_factory=list)
+    pushed : int = 0
+    epsilon : float = 0.0
+    max_leaves : int | None = None
+    max_evaluations : int | None = None
+    leaves : int = 0
+    evaluations : int = 0
+    stopped2 : float = math.inf
 
-class Node:
-    def __init__(self, max_points_in_bucket : int, area : Cuboid, direction : Direction) -> None:
-        self.__max_points_in_bucket : int = max_points_in_bucket
-        self.__area : Cuboid = area
-        self.__leaf : bool = True
-        self.__subnodes : dict[int, "Node"] = {}
-        self.__contents : list[Content] = []
-        self.__contents_count : int = 0
-        self.__direction = direction
-        #logging.debug(f"NEW NODE {self.area()}")
-        return
+    def max_distance2(self) -> float:
+        """
+        Квадрат расстояния до n-го ближайшего (бесконечность, пока найдено меньше n)
+        """
+        if (len(self.heap) < self.n):
+            return math.inf
+        return -self.heap[0][0]
 
-    def __str__(self) -> str:
-        return f"N[leaf={self.__leaf};{self.__contents_count};{len(self.__contents)};dir={self.__direction};{self.__area}]"
+    def prune_distance2(self) -> float:
+        """
+        Квадрат расстояния, начиная с которого области не просматриваются
+        """
+        if (self.epsilon == 0.0):
+            return self.max_distance2()
+        return self.max_distance2()/((1.0 + self.epsilon)**2)
 
-    def __repr__(self) -> str:
-        return f"N[leaf={self.__leaf};{self.__contents_count};{len(self.__contents)};{self.__subnodes}]"
+    def exhausted(self, distance2 : float) -> bool:
+        """
+        Израсходован ли бюджет; distance2 - квадрат расстояния до следующей области обхода
+        """
+        if ((self.max_leaves is not None) and (self.leaves >= self.max_leaves)) or \
+           ((self.max_evaluations is not None) and (self.evaluations >= self.max_evaluations)):
+            self.stopped2 = min(self.stopped2, distance2)
+            return True
+        return False
 
-    def area(self) -> Cuboid:
-        return self.__area
+    def admit(self, distance2 : float, count : int) -> int:
+        """
+        Учесть просмотр листа, возвращает, сколько его данных разрешено проверить
+        distance2 - квадрат расстояния до листа
+        count - количество данных в листе
+        """
+        self.leaves += 1
+        if (self.max_evaluations is not None) and (self.evaluations + count > self.max_evaluations):
+            count = self.max_evaluations - self.evaluations
+            self.stopped2 = min(self.stopped2, distance2)
+        self.evaluations += count
+        return count
 
-    def get_areas(self) -> list[Cuboid]:
-        areas : list[Cuboid] = [self.__area]
-        for _, sn in self.__subnodes.items():
-            areas.extend(sn.get_areas())
-        return areas
+    def bound(self) -> float:
+        """
+        Достигнутая гарантия после поиска: расстояние до n-го найденного
+        не больше bound расстояний до n-го ближайшего в дереве
+        1.0 - результат точный, бесконечность - гарантии нет
+        """
+        found2 = self.max_distance2()
+        lower2 = min(self.stopped2, self.prune_distance2())
+        if (lower2 == math.inf) or (found2 == 0.0):
+            return 1.0
+        if (lower2 == 0.0) or (found2 == math.inf):
+            return math.inf
+        return max(1.0, math.sqrt(found2/lower2))
 
-    def get_contents(self) -> list[Content]:
-        contents = self.__contents.copy()
-        if (not self.__leaf):
-            for _, sn in self.__subnodes.items():
-                contents.extend(sn.get_contents())
-        return contents
+    def push(self, distance2 : float, content : Content) -> None:
+        """
+        Предложить кандидата
+        """
+        self.pushed += 1
+        if (len(self.heap) < self.n):
+            heapq.heappush(self.heap, (-distance2, -self.pushed, content))
+        elif (distance2 < -self.heap[0][0]):
+            heapq.heapreplace(self.heap, (-distance2, -self.pushed, content))
+        return
 
-    def __add_subnode(self, direction : Direction) -> None:
-        p_min = self.__area.point_min()
-        p_max = self.__area.point_max()
-        p_center = p_min.middle(p_max)
-        p = direction.choose_coordinates(p_min, p_max)
-        area = Cuboid(p, p_center)
-        self.__subnodes[direction.hash()] = Node(self.__max_points_in_bucket, area, direction)
+    def contents(self) -> list[Content]:
+        """
+        Найденные данные в порядке возрастания расстояния
+        """
+        return [c for _, _, c in sorted(self.heap, reverse=True)]
+
+    def distances(self) -> list[float]:
+        """
+        Расстояния до найденных данных в порядке возрастания
+        """
+        return sorted(math.sqrt(-d2) for d2, _, _ in self.heap)
+
+@dataclass
+class ApproximateClosest:
+    """
+    Результат приближённого поиска ближайших
+    data - найденные данные в порядке возрастания расстояния
+    distances - расстояния до них
+    bound - достигнутая гарантия: расстояние до n-го найденного не больше bound
+            расстояний до n-го ближайшего в дереве (1.0 - точно, бесконечность - без гарантии)
+    leaves_scanned - просмотрено листьев
+    distance_evaluations - вычислено расстояний
+    """
+    data : list[Any]
+    distances : list[float]
+    bound : float
+    leaves_scanned : int
+    distance_evaluations : int
+
+@dataclass
+class QueryTrace:
+    """
+    Счётчики стоимости запроса
+    kind - вид запроса
+    nodes_visited - посещено узлов
+    leaves_scanned - просмотрено листьев
+    distance_evaluations - вычислено расстояний до хранящихся точек
+    prunes - отброшено узлов без спуска в них
+    """
+    kind : str = ""
+    nodes_visited : int = 0
+    leaves_scanned : int = 0
+    distance_evaluations : int = 0
+    prunes : int = 0
+
+    def add(self, other : "QueryTrace") -> None:
+        self.nodes_visited += other.nodes_visited
+        self.leaves_scanned += other.leaves_scanned
+        self.distance_evaluations += other.distance_evaluations
+        self.prunes += other.prunes
         return
 
-    def add_content(self, content : Content) -> None:
-        #logging.debug(f"add_content {content.point()} -> {self}")
-        self.__contents_count += 1
-        if (not self.__leaf):
-            d = self.__area.point_direction(content.point()).hash()
-            #logging.debug(f"direction={d}")
-            if d not in self.__subnodes:
-                self.__add_subnode(Direction(d))
-            self.__subnodes[d].add_content(content)
-        else:
-            self.__contents.append(content)
-            if (self.__contents_count > self.__max_points_in_bucket):
-                #logging.debug("deepen")
-                self.__leaf = False
-                for c in self.__contents:
-                    self.add_content(c)
-                    self.__contents_count -= 1
-                self.__contents = []
-        return
-
-    def del_content(self, content : Content) -> None:
-        #logging.debug(f"del_content {content.point()} -> {self}")
-        self.__contents_count -= 1
-        if (not self.__leaf):
-            d = self.__area.point_direction(content.point()).hash()
-            #logging.debug(f"direction {d}")
-            self.__subnodes[d].del_content(content)
-            if (self.__contents_count <= self.__max_points_in_bucket):
-                self.__contents = self.get_contents()
-                self.__subnodes.clear()
-                self.__leaf = True
-        else:
-            self.__contents = [c for c in self.__contents if c.data() != content.data()]
+class Tracer:
+    """
+    Инструментирование запросов, подключается через Tree(..., tracer=Tracer())
+    Накапливает суммарные счётчики; чтобы обрабатывать каждый запрос отдельно,
+    переопределите on_query. Без трассировщика дерево счётчики не ведёт
+    """
+    def __init__(self) -> None:
+        self.__queries : int = 0
+        self.__total : QueryTrace = QueryTrace("total")
+        self.__lock = threading.Lock()
         return
 
-    def move_content(self, content : Content, point : Position) -> None:
+    def __str__(self) -> str:
+        return f"queries={self.__queries} {self.__total}"
+
+    def queries(self) -> int:
         """
-        Изменить положение данных
-        content - перемещаемые данные
-        point - новое положение
+        Количество завершённых запросов
         """
-        #logging.debug(f"move_content {content.point()} {self} -> {point}")
-        if (not self.__leaf):
-            d_old = self.__area.point_direction(content.point()).hash()
-            d_new = self.__area.point_direction(point).hash()
-            #logging.debug(f"direction {d_old} -> {d_new}")
-            if (d_new != d_old):
-                self.__subnodes[d_old].del_content(content)
-                if d_new not in self.__subnodes:
-                    self.__add_subnode(Direction(d_new))
-                self.__subnodes[d_new].add_content(Content(point, content.data()))
-            else:
-                self.__subnodes[d_new].move_content(content, point)
-        else:
-            self.__contents = [c for c in self.__contents if c.data() != content.data()]
-            self.__contents.append(Content(point, content.data()))
+        return self.__queries
+
+    def total(self) -> QueryTrace:
+        """
+        Суммарные счётчики всех запросов
+        """
+        return self.__total
+
+    def reset(self) -> None:
+        with self.__lock:
+            self.__queries = 0
+            self.__total = QueryTrace("total")
         return
 
-    def find_data_closest(self, point : Point, n : int, closest : ClosestContent) -> None:
+    def begin(self, kind : str) -> QueryTrace:
         """
-        Найти ближайшие данные
-        point - точка
-        n - количество ближайших
-        c - найденные на предыдущих шагах ближайшие
+        Начать запрос, возвращает счётчики, которые заполняет дерево
         """
-        logging.debug(f"find_data_closest {point} n={n} closest={closest} {self}")
-        if (self.__leaf):
-            for content in self.__contents:
-                logging.debug(f"content={content}")
-                if (len(closest.content) == 0) or (content.point().distance(point) < closest.max_distance):
-                    if (len(closest.content) < n):
-                        closest.content.append(content)
-                    else:
-                        closest.content[-1] = content
-                    closest.content.sort(key=lambda c: c.point().distance(point))
-                    closest.max_distance = closest.content[-1].point().distance(point)
-            return
-        else:
-            d = None
-            print(f"{closest.max_distance}")
-            if (len(closest.content) == 0):
-                d = self.__area.point_direction(point)
-                subn = self.__subnodes.get(d)
-                if (subn):
-                    subn.find_data_closest(point, n, closest)
-            for dr, subnode in self.__subnodes.items():
-                if (dr == d):
-                    continue
-                if (len(closest.content) < n) or (not subnode.area().outside_radius(point, closest.max_distance)):
-                    subnode.find_data_closest(point, n, closest)
+        return QueryTrace(kind)
+
+    def end(self, trace : QueryTrace) -> None:
+        """
+        Завершить запрос
+        Может вызываться из нескольких потоков одновременно
+        """
+        with self.__lock:
+            self.__queries += 1
+            self.__total.add(trace)
+        self.on_query(trace)
         return
 
-    def get_in_radius(self, point : Point, radius : float) -> list[Content]:
+    def on_query(self, trace : QueryTrace) -> None:
         """
-        Найти все данные в круговой окрестности
+        Вызывается по завершении каждого запроса
         """
-        #logging.debug(f"get_in_radius {point} r={radius} {self}")
-        if self.__area.outside_radius(point, radius):
-            return []
-        in_radius : list[Content] = []
-        if (not self.__leaf):
-            for _, sn in self.__subnodes.items():
-                in_radius.extend(sn.get_in_radius(point, radius))
-        else:
-            for c in self.__contents:
-                if (c.point().distance(point) <= radius):
-                    in_radius.append(c)
-        return in_radius
+        pass
 
-class Tree:
+@dataclass
+class CacheStats:
     """
-    Класс дерева для хранения пространственных данных
+    Счётчики кэша запросов
+    hits - ответов из кэша
+    misses - запросов, выполненных обходом дерева
+    invalidations - записей, отброшенных из-за изменения просмотренных узлов
+    evictions - записей, вытесненных по размеру
+    size - записей сейчас
+    """
+    hits : int = 0
+    misses : int = 0
+    invalidations : int = 0
+    evictions : int = 0
+    size : int = 0
+
+class QueryCache:
+    """
+    Кэш результатов запросов с вытеснением давно не использованных (LRU)
+    Вместе с результатом хранятся версии узлов, просмотренных при его получении;
+    запись действительна, пока ни один из этих узлов не изменился
     """
-    def __init__(self, dimension : int, p1 : Position, p2 : Position, max_points_in_bucket : int) -> None:
+    def __init__(self, capacity : int) -> None:
+        assert capacity > 0
+        self.__capacity : int = capacity
+        self.__entries : OrderedDict[Any, tuple[tuple[Any, ...], list[tuple[Any, int]]]] = OrderedDict()
+        self.__stats : CacheStats = CacheStats()
+        self.__lock = threading.Lock()
+        return
+
+    def __str__(self) -> str:
+        return f"QueryCache capacity={self.__capacity} {self.stats()}"
+
+    def stats(self) -> CacheStats:
+        with self.__lock:
+            return CacheStats(self.__stats.hits, self.__stats.misses, self.__stats.invalidations,
+                              self.__stats.evictions, len(self.__entries))
+
+    def get(self, key : Any, is_current : Callable[[list[tuple[Any, int]]], bool]) -> tuple[Any, ...] | None:
         """
-        p1, p2 - точки, ограничивающие область хранения
-        max_points_in_bucket - наибольшее количество точек, которое может храниться в листе дерева
+        Результат по ключу запроса или None, если его нет или он устарел
+        is_current - проверка, что версии узлов не изменились
+        Может вызываться из нескольких потоков одновременно
         """
-        self.__dimension = dimension
-        p1 = Point(p1)
-        p2 = Point(p2)
-        assert p1.dimension() == self.__dimension
-        assert p1.dimension() == p2.dimension()
-        self.__root = Node(max_points_in_bucket, Cuboid(p1, p2), -1)
-        self.__points = {}
+        with self.__lock:
+            entry = self.__entries.get(key)
+            if (entry is not None) and (not is_current(entry[1])):
+                del self.__entries[key]
+                self.__stats.invalidations += 1
+                entry = None
+            if (entry is None):
+                self.__stats.misses += 1
+                return None
+            self.__entries.move_to_end(key)
+            self.__stats.hits += 1
+            return entry[0]
+
+    def put(self, key : Any, result : tuple[Any, ...], visited : list[tuple[Any, int]]) -> None:
+        """
+        Запомнить результат
+        visited - просмотренные узлы и их версии
+        """
+        with self.__lock:
+            self.__entries[key] = (result, visited)
+            self.__entries.move_to_end(key)
+            while len(self.__entries) > self.__capacity:
+                self.__entries.popitem(last=False)
+                self.__stats.evictions += 1
         return
 
-    def __str__(self) -> str:
-        return f"2N_TREE dim={self.__dimension} root={self.__root}"
+    def clear(self) -> None:
+        with self.__lock:
+            self.__entries.clear()
+        return
 
-    def get_points(self) -> list[Point]:
+class ReadWriteLock:
+    """
+    Блокировка "много читателей или один писатель"
+    Пока писатель ждёт, новые читатели не допускаются, поэтому поток изменений
+    не голодает при непрерывных запросах. Блокировка не реентерабельна:
+    поток, держащий её, не должен захватывать её повторно
+    """
+    def __init__(self) -> None:
+        self.__condition = threading.Condition(threading.Lock())
+        self.__readers : int = 0
+        self.__writing : bool = False
+        self.__writers_waiting : int = 0
+        self.__reader = LockGuard(self.acquire_read, self.release_read)
+        self.__writer = LockGuard(self.acquire_write, self.release_write)
+        return
+
+    def reader(self) -> "LockGuard":
         """
-        Получить все координаты хранящихся в дереве данных
+        Контекстный менеджер захвата на чтение
         """
-        return list(self.__points.values())
+        return self.__reader
 
-    def find_data_closest(self, point : Position, n : int) -> list[Any]:
+    def writer(self) -> "LockGuard":
         """
-        Найти несколько данных, наиболее близких к точке
+        Контекстный менеджер захвата на запись
         """
-        assert n > 0
-        if type(point) is not Point:
-            point = Point(point)
-        closest = ClosestContent()
-        self.__root.find_data_closest(point, n, closest)
-        return [c.data() for c in closest.content]
+        return self.__writer
 
-    def get_data_in_radius(self, point : Position, radius : float) -> list[Any]:
+    def acquire_read(self) -> None:
+        with self.__condition:
+            while self.__writing or self.__writers_waiting:
+                self.__condition.wait()
+            self.__readers += 1
+        return
+
+    def release_read(self) -> None:
+        with self.__condition:
+            self.__readers -= 1
+            if (self.__readers == 0):
+                self.__condition.notify_all()
+        return
+
+    def acquire_write(self) -> None:
+        with self.__condition:
+            self.__writers_waiting += 1
+            while self.__writing or self.__readers:
+                self.__condition.wait()
+            self.__writers_waiting -= 1
+            self.__writing = True
+        return
+
+    def release_write(self) -> None:
+        with self.__condition:
+            self.__writing = False
+            self.__condition.notify_all()
+        return
+
+class LockGuard:
+    """
+    Контекстный менеджер, вызывающий заданные функции захвата и освобождения
+    """
+    __slots__ = ("__acquire", "__release")
+
+    def __init__(self, acquire : Callable[[], None], release : Callable[[], None]) -> None:
+        self.__acquire = acquire
+        self.__release = release
+        return
+
+    def __enter__(self) -> "LockGuard":
+        self.__acquire()
+        return self
+
+    def __exit__(self, *exc : Any) -> None:
+        self.__release()
+        return
+
+@dataclass
+class FlatTree:
+    """
+    Дерево, разложенное в плоские массивы
+    Узлы идут в порядке обхода в ширину, поэтому дети каждого узла лежат подряд;
+    данные идут в порядке обхода в глубину, поэтому данные каждого поддерева лежат подряд
+    boxes - углы p_min, затем p_max каждого узла
+    first_child, child_count - номер первого ребёнка и количество детей (0 у листа)
+    first_content, contents_count - начало и длина отрезка данных поддерева
+    """
+    dimension : int
+    max_points_in_bucket : int
+    boxes : list[float] = field(default_factory=list)
+    first_child : list[int] = field(default_factory=list)
+    child_count : list[int] = field(default_factory=list)
+    first_content : list[int] = field(default_factory=list)
+    contents_count : list[int] = field(default_factory=list)
+    contents : list[Content] = field(default_factory=list)
+
+@dataclass(frozen=True)
+class Monoid:
+    """
+    Агрегат, который дерево хранит в каждом узле, подключается через Tree(..., aggregate=...)
+    identity - нейтральный элемент (не должен изменяться)
+    lift(point, data) - значение для одних данных
+    combine(a, b) - ассоциативное объединение двух значений, не изменяющее их
+    """
+    identity : Any
+    lift : Callable[[Point, Any], Any]
+    combine : Callable[[Any, Any], Any]
+
+    @staticmethod
+    def sum(value : Callable[[Point, Any], float] = lambda point, data: data) -> "Monoid":
         """
-        Найти все данные в круговой окрестности
+        Сумма value(точка, данные)
         """
-        if type(point) is not Point:
-            point = Point(point)
-        in_radius = self.__root.get_in_radius(point, radius)
-        return [c.data() for c in in_radius]
+        return Monoid(0, value, lambda a, b: a + b)
 
-    def _get_areas(self) -> list[Cuboid]:
+    @staticmethod
+    def min(value : Callable[[Point, Any], float] = lambda point, data: data) -> "Monoid":
+        return Monoid(math.inf, value, min)
+
+    @staticmethod
+    def max(value : Callable[[Point, Any], float] = lambda point, data: data) -> "Monoid":
+        return Monoid(-math.inf, value, max)
+
+    @staticmethod
+    def centroid(weight : Callable[[Point, Any], float] = lambda point, data: 1.0) -> "Monoid":
         """
-        Получить все окрестности, которые используются для построения дерева
+        Масса и взвешенная сумма координат: (масса, (сумма weight*x_i, ...))
+        Центр масс вычисляет Monoid.center
         """
-        return self.__root.get_areas()
+        def lift(point : Point, data : Any) -> tuple[float, tuple[float, ...]]:
+            w = weight(point, data)
+            return (w, tuple(w*c for c in point))
+        def combine(a : tuple[float, tuple[float, ...]], b : tuple[float, tuple[float, ...]]) -> tuple[float, tuple[float, ...]]:
+            if (not a[1]):
+                return b
+            if (not b[1]):
+                return a
+            return (a[0] + b[0], tuple(x + y for x, y in zip(a[1], b[1])))
+        return Monoid((0.0, ()), lift, combine)
 
-    def add_content(self, point : Position, data : Any) -> None:
+    @staticmethod
+    def center(value : tuple[float, tuple[float, ...]]) -> Point | None:
         """
-        Добавить данные
+        Центр масс по значению Monoid.centroid (None при нулевой массе)
         """
-        #logging.debug(f"--------")
-        if type(point) is not Point:
-            point = Point(point)
-        assert self.__root.area().contains(point)
-        c = Content(point, data)
-        self.__points[c.data()] = c.point()
-        self.__root.add_content(c)
-        return
+        mass, moment = value
+        if (mass == 0.0):
+            return None
+        return Point([m/mass for m in moment])
 
-    def del_data(self, data : Any) -> None:
+@dataclass(frozen=True)
+class Region:
+    """
+    Область запроса подсчёта и агрегатов, проверяемая по границам узлов low, high
+    disjoint(low, high) - узел не задевает область
+    covers(low, high) - узел целиком лежит в области
+    contains(point) - точка лежит в области
+    distances - считать ли проверки точек вычислениями расстояний (см. QueryTrace)
+    """
+    disjoint : Callable[[tuple[float, ...], tuple[float, ...]], bool]
+    covers : Callable[[tuple[float, ...], tuple[float, ...]], bool]
+    contains : Callable[[Point], bool]
+    distances : bool
+
+    @staticmethod
+    def box(box : Cuboid) -> "Region":
         """
-        Удалить данные
+        Прямоугольная область; как и у области дерева, верхняя граница в неё не входит
         """
-        #logging.debug(f"--------")
-        p = self.__points.pop(data)
-        self.__root.del_content(Content(p, data))
-        return
+        o_low = box.point_min()
+        o_high = box.point_max()
+        def disjoint(low : tuple[float, ...], high : tuple[float, ...]) -> bool:
+            for c_min, c_max, o_min, o_max in zip(low, high, o_low, o_high):
+                if (c_min >= o_max) or (o_min >= c_max):
+                    return True
+            return False
+        def covers(low : tuple[float, ...], high : tuple[float, ...]) -> bool:
+            for c_min, c_max, o_min, o_max in zip(low, high, o_low, o_high):
+                if (c_min < o_min) or (c_max > o_max):
+                    return False
+            return True
+        return Region(disjoint, covers, box.contains, False)
 
-    def move_data(self, data : Any, point : Position) -> None:
+    @staticmethod
+    def radius(point : Point, radius : float) -> "Region":
         """
-        Переместить данные
+        Круговая окрестность точки
         """
-        #logging.debug(f"--------")
-        if type(point) is not Point:
-            point = Point(point)
-        p = self.__points.pop(data)
-        self.__points[data] = point
-        self.__root.move_content(Content(p, data), point)
-        return
+        radius2 = radius*radius
+        def disjoint(low : tuple[float, ...], high : tuple[float, ...]) -> bool:
+            d : float = 0.0
+            for x, a, b in zip(point, low, high):
+                if (x < a):
+                    d += (a - x)*(a - x)
+                elif (x > b):
+                    d += (x - b)*(x - b)
+            return d > radius2
+        def covers(low : tuple[float, ...], high : tuple[float, ...]) -> bool:
+            d : float = 0.0
+            for x, a, b in zip(point, low, high):
+                delta = max(x - a, b - x)
+                d += delta*delta
+            return d <= radius2
+        return Region(disjoint, covers, lambda p: p.distance2(point) <= radius2, True)
+
+class Node:
+    """
+    Узел дерева
+    Лист глубины max_depth не разбивается и может хранить больше max_points_in_bucket
+    данных (лист переполнения), например совпадающие точки. Цепочки узлов с единственным
+    занятым подузлом не создаются: подузел сразу получает наименьшую ячейку,
+    содержащую все его данные (сжатие путей), а глубина узла считается в уровнях деления
+    """
+    __slots__ = ("__max_points_in_bucket", "__area", "__leaf", "__subnodes", "__contents",
+                 "__contents_count", "__direction", "__block", "__parent", "__depth", "__max_depth",
+                 "__version", "__summary")
+
+    def __init__(self, max_points_in_bucket : int, area : Cuboid, direction : Direction,
+                 parent : "Node | None" = None, depth : int = 0, max_depth : int = 64) -> None:
+        self.__max_points_in_bucket : int = max_points_in_bucket
+        self.__max_depth : int = max_depth
+        self.__depth : int = depth
+        self.__area : Cuboid = area
+        self.__leaf : bool = True
+        self.__subnodes : dict[int, "Node"] = {}
+        self.__contents : list[Content] = []
+        self.__contents_count : int = 0
+        self.__direction = direction
+        self.__block : "tuple[np.ndarray, np.ndarray] | None" = None
+        # агрегат поддерева (см. Monoid), вычисляется при запросе и сбрасывается вместе с __block
+        self.__summary : Any = None
+        self.__parent = parent
+        # растёт при каждом изменении данных листа или набора подузлов (см. QueryCache)
+        self.__version : int = 0
+        return
+
+    def __str__(self) -> str:
+        return f"N[leaf={self.__leaf};{self.__contents_count};{len(self.__contents)};dir={self.__direction};{self.__area}]"
+
+    def __repr__(self) -> str:
+        return f"N[leaf={self.__leaf};{self.__contents_count};{len(self.__contents)};{self.__subnodes}]"
+
+    def area(self) -> Cuboid:
+        return self.__area
+
+    def get_areas(self) -> list[Cuboid]:
+        areas : list[Cuboid] = [self.__area]
+        for _, sn in self.__subnodes.items():
+            areas.extend(sn.get_areas())
+        return areas
+
+    def get_contents(self) -> list[Content]:
+        return list(self.iter_contents())
+
+    def iter_contents(self) -> Iterator[Content]:
+        """
+        Перебрать все данные поддерева, обходя его явным стеком
+        """
+        stack : list[Node] = [self]
+        while stack:
+            node = stack.pop()
+            if (node.__leaf):
+                yield from node.__contents
+            else:
+                stack.extend(node.__subnodes.values())
+        return
+
+    def flatten(self) -> FlatTree:
+        """
+        Разложить поддерево в плоские массивы
+        """
+        flat = FlatTree(self.__area.dimension(), self.__max_points_in_bucket)
+        first_content : dict[int, int] = {}
+        stack : list[Node] = [self]
+        while stack:
+            node = stack.pop()
+            first_content[id(node)] = len(flat.contents)
+            if (node.__leaf):
+                flat.contents.extend(node.__contents)
+            else:
+                stack.extend(node.__subnodes.values())
+        nodes : list[Node] = [self]
+        i = 0
+        while i < len(nodes):
+            node = nodes[i]
+            i += 1
+            flat.boxes.extend(node.__area.point_min())
+            flat.boxes.extend(node.__area.point_max())
+            flat.first_child.append(len(nodes))
+            flat.child_count.append(len(node.__subnodes))
+            flat.first_content.append(first_content[id(node)])
+            flat.contents_count.append(node.__contents_count)
+            nodes.extend(node.__subnodes.values())
+        return flat
+
+    def is_current(self, visited : list[tuple["Node", int]]) -> bool:
+        """
+        Не изменился ли ни один из узлов с момента, когда были записаны их версии
+        """
+        for node, version in visited:
+            if (node.__version != version):
+                return False
+        return True
+
+    def __add_subnode(self, direction : Direction) -> None:
+        self.__version += 1
+        area = self.__area.subarea(direction.hash())
+        self.__subnodes[direction.hash()] = Node(self.__max_points_in_bucket, area, direction, self,
+                                                 self.__depth + 1, self.__max_depth)
+        return
+
+    def __subnode_for(self, point : Point) -> "Node":
+        """
+        Подузел, в который должна попасть точка внутренней области узла
+        Недостающий подузел создаётся. Если сжатый подузел не содержит точку,
+        лист просто расширяется до своей ячейки, а перед внутренним узлом вставляется
+        промежуточный узел в наименьшей ячейке, содержащей и подузел, и точку
+        """
+        d = self.__area.point_direction(point).hash()
+        subnode = self.__subnodes.get(d)
+        if (subnode is None):
+            self.__add_subnode(Direction(d))
+            return self.__subnodes[d]
+        if (subnode.__area.contains(point)):
+            return subnode
+        area = self.__area.subarea(d)
+        if (subnode.__leaf):
+            subnode.__area = area
+            subnode.__depth = self.__depth + 1
+            subnode.__version += 1
+            # запросы, отбросившие прежнюю ячейку листа, записали только этот узел
+            self.__version += 1
+            return subnode
+        depth = self.__depth + 1
+        while True:
+            sd = area.point_direction(subnode.__area.point_min()).hash()
+            if (sd != area.point_direction(point).hash()):
+                break
+            area = area.subarea(sd)
+            depth += 1
+        middle = Node(self.__max_points_in_bucket, area, Direction(d), self, depth, self.__max_depth)
+        middle.__leaf = False
+        middle.__contents_count = subnode.__contents_count
+        middle.__subnodes[sd] = subnode
+        subnode.__parent = middle
+        subnode.__direction = Direction(sd)
+        self.__subnodes[d] = middle
+        self.__version += 1
+        return middle
+
+    def __can_split(self) -> bool:
+        return (self.__contents_count > self.__max_points_in_bucket) and (self.__depth < self.__max_depth)
+
+    def grow(self, point : Point) -> "Node":
+        """
+        Расширить область дерева до точки, вызывается для корня, возвращает новый корень
+        Область удваивается в сторону точки, пока не накроет её, и старый корень
+        становится подузлом нового, сжатым (см. __subnode_for), если удвоений было
+        несколько: промежуточные уровни не создаются. Если из-за округления старая
+        область не совпала с ячейкой новой, дерево строится заново в новой области
+        """
+        area = self.__area
+        d : int = 0
+        aligned = True
+        while not area.contains(point):
+            larger, d = area.enclosing(point)
+            aligned = aligned and larger.subarea(d).same(area)
+            area = larger
+        if (area is self.__area):
+            return self
+        if (self.__leaf):
+            self.__area = area
+            return self
+        root = Node(self.__max_points_in_bucket, area, -1, max_depth=self.__max_depth)
+        if (not aligned):
+            root.load_contents(self.get_contents())
+            return root
+        root.__leaf = False
+        root.__contents_count = self.__contents_count
+        root.__subnodes[d] = self
+        self.__parent = root
+        self.__direction = Direction(d)
+        return root
+
+    def shrink(self) -> "Node":
+        """
+        Сузить область дерева, вызывается для корня, возвращает новый корень
+        Пока у корня единственный подузел, корнем становится этот подузел
+        """
+        root = self
+        while (not root.__leaf) and (len(root.__subnodes) == 1):
+            root = next(iter(root.__subnodes.values()))
+            root.__parent = None
+            root.__direction = -1
+        return root
+
+    def __split(self, contents : list[Content]) -> None:
+        """
+        Сделать узел внутренним и разложить данные по вновь созданным подузлам
+        Подузел, который сам будет разбит, сразу получает наименьшую ячейку с его данными
+        """
+        self.__leaf = False
+        self.__contents = []
+        self.__version += 1
+        for d, group in self.__area.partition(contents).items():
+            area = self.__area.subarea(d)
+            depth = self.__depth + 1
+            if (len(group) > self.__max_points_in_bucket):
+                while depth < self.__max_depth:
+                    groups = area.partition(group)
+                    if (len(groups) != 1):
+                        break
+                    area = area.subarea(next(iter(groups)))
+                    depth += 1
+            subnode = Node(self.__max_points_in_bucket, area, Direction(d), self, depth, self.__max_depth)
+            self.__subnodes[d] = subnode
+            subnode.load_contents(group)
+        return
+
+    def __collapse(self) -> None:
+        """
+        Сделать узел листом, собрав в него все данные поддерева
+        Отброшенные подузлы отвязываются от родителей
+        """
+        contents : list[Content] = []
+        stack = list(self.__subnodes.values())
+        while stack:
+            node = stack.pop()
+            node.__parent = None
+            node.__version += 1
+            contents.extend(node.__contents)
+            stack.extend(node.__subnodes.values())
+        self.__subnodes.clear()
+        self.__leaf = True
+        self.__set_contents(contents)
+        return
+
+    def __set_contents(self, contents : list[Content]) -> None:
+        self.__version += 1
+        self.__contents = contents
+        for i, c in enumerate(contents):
+            c.locate(self, i)
+        return
+
+    def __append(self, content : Content) -> None:
+        self.__version += 1
+        content.locate(self, len(self.__contents))
+        self.__contents.append(content)
+        return
+
+    def __swap_remove(self, content : Content) -> None:
+        """
+        Убрать данные из листа, поставив на их место последний элемент списка
+        """
+        self.__version += 1
+        i = content.slot()
+        last = self.__contents.pop()
+        if (last is not content):
+            self.__contents[i] = last
+            last.locate(self, i)
+        return
+
+    def add_content(self, content : Content) -> None:
+        self.__block = None
+        self.__summary = None
+        self.__contents_count += 1
+        if (not self.__leaf):
+            self.__subnode_for(content.point()).add_content(content)
+        else:
+            self.__append(content)
+            if (self.__can_split()):
+                self.__split(self.__contents)
+        return
+
+    def load_contents(self, contents : list[Content]) -> None:
+        """
+        Заполнить пустой узел набором данных за один проход сверху вниз
+        Данные сразу разбиваются по направлениям, каждый узел создаётся один раз
+        """
+        assert self.__contents_count == 0
+        self.__contents_count = len(contents)
+        if (self.__can_split()):
+            self.__split(contents)
+        else:
+            self.__set_contents(contents)
+        return
+
+    def remove_content(self, content : Content) -> None:
+        """
+        Удалить данные из этого листа
+        Слияние опустевших узлов не выполняется (см. rebalance)
+        """
+        self.__swap_remove(content)
+        node = self
+        while node is not None:
+            node.__contents_count -= 1
+            node.__block = None
+            node.__summary = None
+            node = node.__parent
+        return
+
+    def relocate_content(self, content : Content, point : Point,
+                         overfull : list["Node"], vacated : list["Node"]) -> None:
+        """
+        Переместить данные из этого листа в новое положение
+        Если точка осталась в области листа, меняется только лист. Иначе данные
+        поднимаются к предкам лишь до первого узла, содержащего новое положение,
+        и опускаются от него в новый лист. Разбиение и слияние узлов откладываются:
+        переполненный лист добавляется в overfull, покинутый - в vacated (см. rebalance)
+        """
+        if (self.__area.contains(point)):
+            content.move(point)
+            self.__version += 1
+            target = self
+        else:
+            self.__swap_remove(content)
+            content.move(point)
+            vacated.append(self)
+            target = self
+            while not target.__area.contains(point):
+                target.__contents_count -= 1
+                target.__block = None
+                target.__summary = None
+                target = target.__parent
+                assert target is not None
+            node = target
+            while not node.__leaf:
+                node = node.__subnode_for(point)
+                node.__contents_count += 1
+                node.__block = None
+                node.__summary = None
+            node.__append(content)
+            if (node.__can_split()):
+                overfull.append(node)
+        while target is not None:
+            target.__block = None
+            target.__summary = None
+            target = target.__parent
+        return
+
+    def delete_content(self, content : Content) -> None:
+        """
+        Удалить данные из дерева, вызывается для корня
+        """
+        leaf = content.leaf()
+        leaf.remove_content(content)
+        self.rebalance([], [leaf])
+        return
+
+    def move_contents(self, moves : Iterable[tuple[Content, Point]]) -> None:
+        """
+        Переместить пакет данных, вызывается для корня
+        moves - пары (данные, новое положение внутри области корня)
+        """
+        overfull : list[Node] = []
+        vacated : list[Node] = []
+        for content, point in moves:
+            content.leaf().relocate_content(content, point, overfull, vacated)
+        if overfull or vacated:
+            self.rebalance(overfull, vacated)
+        return
+
+    def rebalance(self, overfull : list["Node"], vacated : list["Node"]) -> None:
+        """
+        Выполнить отложенные при перемещениях слияния и разбиения узлов
+        Вызывается для корня. Сначала в лист сливается самый верхний внутренний
+        предок каждого покинутого листа, в котором осталось не больше max_points_in_bucket
+        данных, затем разбиваются оставшиеся в дереве переполненные листья
+        """
+        for leaf in vacated:
+            top = None
+            node = leaf
+            while node is not None:
+                if (not node.__leaf) and (node.__contents_count <= node.__max_points_in_bucket):
+                    top = node
+                node = node.__parent
+            if (top is not None):
+                top.__collapse()
+        for leaf in overfull:
+            attached = (leaf is self) or (leaf.__parent is not None)
+            if attached and (leaf.__leaf) and (leaf.__can_split()):
+                leaf.__split(leaf.__contents)
+        return
+
+    def find_data_closest(self, point : Point, closest : ClosestContent, trace : QueryTrace | None = None,
+                          visited : list[tuple["Node", int]] | None = None) -> None:
+        """
+        Найти ближайшие данные обходом "лучший-первым"
+        point - точка
+        closest - найденные ближайшие, дополняется по ходу поиска
+        trace - счётчики стоимости запроса
+        visited - если задан, в него записываются просмотренные узлы с их версиями
+        Узлы извлекаются из очереди по возрастанию расстояния от точки до их области,
+        обход прекращается, как только ближайшая оставшаяся область дальше n-го найденного
+        (при closest.epsilon > 0 - дальше n-го найденного, делённого на 1 + epsilon)
+        или израсходован бюджет closest
+        """
+        queue : list[tuple[float, int, Node]] = [(self.__area.min_distance2(point), 0, self)]
+        pushed : int = 1
+        while queue:
+            d2, _, node = heapq.heappop(queue)
+            if (d2 >= closest.prune_distance2()) or closest.exhausted(d2):
+                if (trace is not None):
+                    trace.prunes += len(queue) + 1
+                break
+            if (trace is not None):
+                trace.nodes_visited += 1
+            if (visited is not None):
+                visited.append((node, node.__version))
+            if (node.__leaf):
+                contents = node.__contents
+                count = closest.admit(d2, len(contents))
+                if (count < len(contents)):
+                    contents = contents[:count]
+                if (trace is not None):
+                    trace.leaves_scanned += 1
+                    trace.distance_evaluations += count
+                for content in contents:
+                    closest.push(content.point().distance2(point), content)
+            else:
+                for subnode in node.__subnodes.values():
+                    sd2 = subnode.__area.min_distance2(point)
+                    if (sd2 < closest.prune_distance2()):
+                        heapq.heappush(queue, (sd2, pushed, subnode))
+                        pushed += 1
+                    elif (trace is not None):
+                        trace.prunes += 1
+        return
+
+    def get_in_radius(self, point : Point, radius : float, trace : QueryTrace | None = None) -> list[Content]:
+        """
+        Найти все данные в круговой окрестности
+        """
+        return list(self.iter_in_radius(point, radius, trace))
+
+    def iter_in_radius(self, point : Point, radius : float, trace : QueryTrace | None = None,
+                       visited : list[tuple["Node", int]] | None = None) -> Iterator[Content]:
+        """
+        Перебрать данные в круговой окрестности по мере нахождения
+        Обход ведётся явным стеком: результаты не копируются между уровнями дерева,
+        а перебор можно прервать в любой момент. Данные узлов, целиком лежащих
+        в окрестности, отдаются без проверки каждой точки
+        visited - если задан, в него записываются просмотренные узлы с их версиями;
+                  тогда и узлы, целиком лежащие в окрестности, обходятся до листьев
+        """
+        radius2 = radius*radius
+        stack : list[Node] = [self]
+        while stack:
+            node = stack.pop()
+            if (node.__area.min_distance2(point) > radius2):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            if (visited is not None):
+                visited.append((node, node.__version))
+            elif (node.__area.max_distance2(point) <= radius2):
+                yield from node.iter_contents()
+                continue
+            if (not node.__leaf):
+                stack.extend(node.__subnodes.values())
+            else:
+                if (trace is not None):
+                    trace.leaves_scanned += 1
+                    trace.distance_evaluations += len(node.__contents)
+                for c in node.__contents:
+                    if (c.point().distance2(point) <= radius2):
+                        yield c
+        return
+
+    def iter_in_box(self, box : Cuboid, trace : QueryTrace | None = None) -> Iterator[Content]:
+        """
+        Перебрать данные внутри прямоугольной области
+        Узлы, целиком лежащие в области, отдаются без проверки каждой точки
+        """
+        stack : list[Node] = [self]
+        while stack:
+            node = stack.pop()
+            if (not node.__area.intersects(box)):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            if (node.__area.inside(box)):
+                yield from node.iter_contents()
+            elif (not node.__leaf):
+                stack.extend(node.__subnodes.values())
+            else:
+                if (trace is not None):
+                    trace.leaves_scanned += 1
+                for c in node.__contents:
+                    if (box.contains(c.point())):
+                        yield c
+        return
+
+    def __fold(self, region : Region, covered : Callable[["Node"], Any], lift : Callable[[Content], Any],
+               combine : Callable[[Any, Any], Any], value : Any, trace : QueryTrace | None = None) -> Any:
+        """
+        Общий обход подсчёта и агрегатов: свернуть данные, попавшие в область запроса
+        covered(node) - значение узла, целиком лежащего в области (хранящееся в нём)
+        lift(content) - значение одних данных листа, попавших в область
+        combine - объединение значений, value - начальное значение
+        """
+        stack : list[Node] = [self]
+        while stack:
+            node = stack.pop()
+            low = node.__area.point_min()
+            high = node.__area.point_max()
+            if (region.disjoint(low, high)):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            if (region.covers(low, high)):
+                value = combine(value, covered(node))
+            elif (not node.__leaf):
+                stack.extend(node.__subnodes.values())
+            else:
+                if (trace is not None):
+                    trace.leaves_scanned += 1
+                    if (region.distances):
+                        trace.distance_evaluations += len(node.__contents)
+                for c in node.__contents:
+                    if (region.contains(c.point())):
+                        value = combine(value, lift(c))
+        return value
+
+    def count_in_box(self, box : Cuboid, trace : QueryTrace | None = None) -> int:
+        """
+        Подсчитать данные внутри прямоугольной области
+        Для узлов, целиком лежащих в области, берётся хранящееся в них количество
+        """
+        return self.__fold(Region.box(box), lambda node: node.__contents_count, lambda c: 1, add, 0, trace)
+
+    def count_in_radius(self, point : Point, radius : float, trace : QueryTrace | None = None) -> int:
+        """
+        Подсчитать данные в круговой окрестности
+        Для узлов, целиком лежащих в окрестности, берётся хранящееся в них количество
+        """
+        return self.__fold(Region.radius(point, radius), lambda node: node.__contents_count, lambda c: 1,
+                           add, 0, trace)
+
+    def summary(self, monoid : Monoid) -> Any:
+        """
+        Агрегат всех данных поддерева
+        Хранится в узле до изменения данных поддерева, пересчитывается только сброшенное
+        """
+        if (self.__summary is None):
+            # узлы без агрегата в порядке обхода в глубину: дети идут после родителя,
+            # поэтому с конца списка каждый узел вычисляется после своих детей
+            order : list[Node] = []
+            stack : list[Node] = [self]
+            while stack:
+                node = stack.pop()
+                order.append(node)
+                if (not node.__leaf):
+                    stack.extend(subnode for subnode in node.__subnodes.values() if subnode.__summary is None)
+            for node in reversed(order):
+                value = monoid.identity
+                if (node.__leaf):
+                    for c in node.__contents:
+                        value = monoid.combine(value, monoid.lift(c.point(), c.data()))
+                else:
+                    for subnode in node.__subnodes.values():
+                        value = monoid.combine(value, subnode.__summary)
+                node.__summary = value
+        return self.__summary
+
+    def aggregate_in_box(self, box : Cuboid, monoid : Monoid, trace : QueryTrace | None = None) -> Any:
+        """
+        Агрегат данных внутри прямоугольной области
+        Для узлов, целиком лежащих в области, берётся их хранящийся агрегат
+        """
+        return self.__fold(Region.box(box), lambda node: node.summary(monoid),
+                           lambda c: monoid.lift(c.point(), c.data()), monoid.combine, monoid.identity, trace)
+
+    def aggregate_in_radius(self, point : Point, radius : float, monoid : Monoid,
+                            trace : QueryTrace | None = None) -> Any:
+        """
+        Агрегат данных в круговой окрестности
+        Для узлов, целиком лежащих в окрестности, берётся их хранящийся агрегат
+        """
+        return self.__fold(Region.radius(point, radius), lambda node: node.summary(monoid),
+                           lambda c: monoid.lift(c.point(), c.data()), monoid.combine, monoid.identity, trace)
+
+    def pairs_within(self, radius : float, trace : QueryTrace | None = None) -> list[tuple[Content, Content]]:
+        """
+        Найти все пары данных поддерева на расстоянии не больше radius, каждую пару один раз
+        Двойной обход дерева: пары узлов, области которых дальше radius друг от друга,
+        отбрасываются целиком, точки сравниваются только между парами листьев
+        """
+        r2 = radius*radius
+        pairs : list[tuple[Content, Content]] = []
+        stack : list[tuple[Node, Node]] = [(self, self)]
+        while stack:
+            a, b = stack.pop()
+            if (a is b):
+                if (trace is not None):
+                    trace.nodes_visited += 1
+                if (a.__leaf):
+                    contents = a.__contents
+                    if (trace is not None):
+                        trace.leaves_scanned += 1
+                        trace.distance_evaluations += len(contents)*(len(contents) - 1)//2
+                    for i, ci in enumerate(contents):
+                        pi = ci.point()
+                        for cj in contents[i + 1:]:
+                            if (pi.distance2(cj.point()) <= r2):
+                                pairs.append((ci, cj))
+                else:
+                    subnodes = list(a.__subnodes.values())
+                    for i, si in enumerate(subnodes):
+                        stack.append((si, si))
+                        for sj in subnodes[i + 1:]:
+                            stack.append((si, sj))
+                continue
+            if (a.__area.min_distance2_to(b.__area) > r2):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            if (a.__leaf) and (b.__leaf):
+                if (trace is not None):
+                    trace.leaves_scanned += 2
+                    trace.distance_evaluations += len(a.__contents)*len(b.__contents)
+                for ca in a.__contents:
+                    pa = ca.point()
+                    for cb in b.__contents:
+                        if (pa.distance2(cb.point()) <= r2):
+                            pairs.append((ca, cb))
+            elif (a.__leaf) or ((not b.__leaf) and (b.__contents_count > a.__contents_count)):
+                for sb in b.__subnodes.values():
+                    stack.append((a, sb))
+            else:
+                for sa in a.__subnodes.values():
+                    stack.append((sa, b))
+        return pairs
+
+    def __get_block(self) -> tuple["np.ndarray", "np.ndarray"]:
+        """
+        Координаты всех данных поддерева массивом формы (k, d) и сами данные массивом объектов
+        Блок сохраняется в узле до первого изменения поддерева
+        """
+        if (self.__block is None):
+            contents = self.get_contents()
+            data = np.empty(len(contents), dtype=object)
+            data[:] = [c.data() for c in contents]
+            self.__block = (np.array([c.point() for c in contents], dtype=float), data)
+        return self.__block
+
+    def get_in_radius_many(self, queries : "np.ndarray", radius : float, block_size : int = 256,
+                           trace : QueryTrace | None = None) -> list[list[Any]]:
+        """
+        Найти данные в круговых окрестностях сразу для набора точек (требуется NumPy)
+        Возвращает сами данные, а не Content, чтобы не проходить по результатам повторно
+        queries - массив точек формы (m, d)
+        block_size - поддеревья не больше этого размера обрабатываются одной матрицей расстояний
+        Обход общий для всех запросов: в узел спускаются только запросы, чья окрестность
+        задевает его область
+        """
+        results : list[list[Any]] = [[] for _ in range(len(queries))]
+        r2 = radius*radius
+        stack : list[tuple[Node, np.ndarray]] = [(self, np.arange(len(queries)))]
+        while stack:
+            node, active = stack.pop()
+            q = queries[active]
+            near = node.__area.min_distance2_many(q) <= r2
+            if (not near.all()):
+                active = active[near]
+                q = q[near]
+            if (len(active) == 0):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            if (node.__leaf) or (node.__contents_count <= block_size):
+                if (node.__contents_count == 0):
+                    continue
+                coordinates, data = node.__get_block()
+                if (trace is not None):
+                    trace.leaves_scanned += 1
+                    trace.distance_evaluations += len(active)*len(data)
+                diff = q[:, None, :] - coordinates[None, :, :]
+                hits = np.einsum("ijk,ijk->ij", diff, diff) <= r2
+                for i in np.flatnonzero(hits.any(axis=1)).tolist():
+                    results[active[i]].extend(data[hits[i]].tolist())
+            else:
+                for subnode in node.__subnodes.values():
+                    stack.append((subnode, active))
+        return results
+
+    def find_data_closest_many(self, queries : "np.ndarray", n : int, block_size : int = 256,
+                               trace : QueryTrace | None = None) -> list[list[Any]]:
+        """
+        Найти ближайшие данные сразу для набора точек (требуется NumPy)
+        Возвращает сами данные, а не Content, чтобы не проходить по результатам повторно
+        queries - массив точек формы (m, d)
+        n - количество ближайших
+        block_size - поддеревья не больше этого размера обрабатываются одной матрицей расстояний
+        Сначала каждый запрос спускается в блок, содержащий его точку, что сразу даёт
+        близкие оценки n-го расстояния. Затем общий обход в глубину отбрасывает запрос
+        из узла, как только область дальше его n-го найденного
+        """
+        m = len(queries)
+        best_d2 = np.full((m, n), np.inf)
+        # найденные данные хранятся номерами в объединении просмотренных блоков
+        best = np.zeros((m, n), dtype=np.int64)
+        sources : list[np.ndarray] = []
+        offsets : dict[int, int] = {}
+        size : int = 0
+        seeded = np.zeros(m, dtype=np.int64)
+
+        def merge(node : Node, active : np.ndarray) -> None:
+            nonlocal size
+            coordinates, data = node.__get_block()
+            offset = offsets.get(id(node))
+            if (offset is None):
+                offset = offsets[id(node)] = size
+                sources.append(data)
+                size += len(data)
+            if (trace is not None):
+                trace.leaves_scanned += 1
+                trace.distance_evaluations += len(active)*len(data)
+            diff = queries[active][:, None, :] - coordinates[None, :, :]
+            d2 = np.einsum("ijk,ijk->ij", diff, diff)
+            candidates_d2 = np.concatenate((best_d2[active], d2), axis=1)
+            candidates = np.concatenate((best[active], np.broadcast_to(np.arange(offset, offset + len(data)), d2.shape)), axis=1)
+            rows = np.arange(len(active))[:, None]
+            if (candidates_d2.shape[1] > n):
+                part = np.argpartition(candidates_d2, n - 1, axis=1)[:, :n]
+                candidates_d2 = candidates_d2[rows, part]
+                candidates = candidates[rows, part]
+            order = np.argsort(candidates_d2, axis=1)
+            best_d2[active] = candidates_d2[rows, order]
+            best[active] = candidates[rows, order]
+            return
+
+        stack : list[tuple[Node, np.ndarray]] = [(self, np.arange(m))]
+        while stack:
+            node, active = stack.pop()
+            if (node.__contents_count == 0):
+                continue
+            if (node.__leaf) or (node.__contents_count <= block_size):
+                merge(node, active)
+                seeded[active] = id(node)
+                continue
+            p_min = np.asarray(node.__area.point_min())
+            p_mid = (p_min + np.asarray(node.__area.point_max()))/2
+            directions = (queries[active] >= p_mid) @ (2**np.arange(len(p_mid)))
+            for d, subnode in node.__subnodes.items():
+                own = active[directions == d]
+                if (len(own) > 0):
+                    stack.append((subnode, own))
+
+        stack = [(self, np.arange(m))]
+        while stack:
+            node, active = stack.pop()
+            q = queries[active]
+            near = node.__area.min_distance2_many(q) < best_d2[active, -1]
+            if (not near.all()):
+                active = active[near]
+                q = q[near]
+            if (len(active) == 0):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            if (node.__leaf) or (node.__contents_count <= block_size):
+                active = active[seeded[active] != id(node)]
+                if (len(active) > 0) and (node.__contents_count > 0):
+                    merge(node, active)
+            else:
+                # ближайший к группе запросов узел кладётся в стек последним
+                subnodes = list(node.__subnodes.values())
+                distances = [sn.__area.min_distance2_many(q).mean() for sn in subnodes]
+                for i in sorted(range(len(subnodes)), key=lambda i: distances[i], reverse=True):
+                    stack.append((subnodes[i], active))
+        if (size == 0):
+            return [[] for _ in range(m)]
+        best_data = np.concatenate(sources)[best]
+        found = np.isfinite(best_d2)
+        if (found.all()):
+            return best_data.tolist()
+        return [row[mask].tolist() for row, mask in zip(best_data, found)]
+
+class NodeArena:
+    """
+    Дерево в виде параллельных массивов, индексируемых номером узла
+    Альтернатива графу объектов Node, выбирается через Tree(..., engine="arena").
+    Для узла хранятся родитель, направление от родителя, количество данных поддерева,
+    маска занятых направлений и начало блока номеров детей в общей таблице
+    (дети идут в нём по возрастанию направления), у листа - список данных.
+    Границы узлов не хранятся: они вычисляются при обходе из области корня
+    и направлений на пути к узлу; у сжатого узла (см. Node) остаток пути от родителя
+    хранится в отдельном словаре. Номера освобождённых узлов используются повторно
+    """
+    __slots__ = ("__max_points_in_bucket", "__max_depth", "__area", "__low", "__high", "__parent",
+                 "__direction", "__tails", "__depth", "__count", "__mask", "__child_base", "__contents",
+                 "__child_slots", "__garbage", "__free", "__version", "__summary")
+
+    FREE = -2
+
+    def __init__(self, max_points_in_bucket : int, area : Cuboid, max_depth : int = 64) -> None:
+        self.__max_points_in_bucket : int = max_points_in_bucket
+        self.__max_depth : int = max_depth
+        self.__set_area(area)
+        self.__clear()
+        return
+
+    def __set_area(self, area : Cuboid) -> None:
+        self.__area : Cuboid = area
+        self.__low : tuple[float, ...] = tuple(area.point_min())
+        self.__high : tuple[float, ...] = tuple(area.point_max())
+        return
+
+    def __clear(self) -> None:
+        """
+        Оставить один пустой корень
+        """
+        self.__parent : list[int] = [-1]
+        self.__direction : list[int] = [0]
+        # сжатые узлы: номер -> направления от ячейки direction до ячейки узла
+        self.__tails : dict[int, tuple[int, ...]] = {}
+        self.__depth : list[int] = [0]
+        self.__count : list[int] = [0]
+        self.__mask : list[int] = [0]
+        self.__child_base : list[int] = [0]
+        self.__contents : list[list[Content] | None] = [[]]
+        self.__child_slots : list[int] = []
+        # количество записей таблицы детей, оставшихся от перезаписанных блоков
+        self.__garbage : int = 0
+        self.__free : list[int] = []
+        # версии узлов (см. Node); номера освобождённых узлов сохраняют свою версию
+        self.__version : list[int] = [0]
+        # агрегаты поддеревьев (см. Node.summary), None - не вычислен или сброшен
+        self.__summary : list[Any] = [None]
+        return
+
+    def __str__(self) -> str:
+        return f"ARENA[nodes={len(self.__parent) - len(self.__free)};{self.__count[0]};{self.__area}]"
+
+    def area(self) -> Cuboid:
+        return self.__area
+
+    @staticmethod
+    def __child_box(low : tuple[float, ...], high : tuple[float, ...],
+                    direction : int) -> tuple[tuple[float, ...], tuple[float, ...]]:
+        """
+        Границы ребёнка в заданном направлении по границам родителя
+        """
+        c_low : list[float] = []
+        c_high : list[float] = []
+        for a, b in zip(low, high):
+            mid = (a + b)/2
+            if (direction & 1):
+                c_low.append(mid)
+                c_high.append(b)
+            else:
+                c_low.append(a)
+                c_high.append(mid)
+            direction >>= 1
+        return tuple(c_low), tuple(c_high)
+
+    @staticmethod
+    def __point_direction(low : tuple[float, ...], high : tuple[float, ...], point : Point) -> int:
+        d : int = 0
+        n : int = 1
+        for x, a, b in zip(point, low, high):
+            if (x >= (a + b)/2):
+                d += n
+            n += n
+        return d
+
+    @staticmethod
+    def __contains(low : tuple[float, ...], high : tuple[float, ...], point : Point) -> bool:
+        for x, a, b in zip(point, low, high):
+            if (x < a) or (x >= b):
+                return False
+        return True
+
+    @staticmethod
+    def __min_distance2(low : tuple[float, ...], high : tuple[float, ...], point : Point) -> float:
+        d : float = 0.0
+        for x, a, b in zip(point, low, high):
+            if (x < a):
+                d += (a - x)*(a - x)
+            elif (x > b):
+                d += (x - b)*(x - b)
+        return d
+
+    @staticmethod
+    def __max_distance2(low : tuple[float, ...], high : tuple[float, ...], point : Point) -> float:
+        d : float = 0.0
+        for x, a, b in zip(point, low, high):
+            delta = max(x - a, b - x)
+            d += delta*delta
+        return d
+
+    def __box_of(self, node : int, low : tuple[float, ...],
+                 high : tuple[float, ...]) -> tuple[tuple[float, ...], tuple[float, ...]]:
+        """
+        Границы узла по границам его родителя
+        """
+        low, high = self.__child_box(low, high, self.__direction[node])
+        if (self.__tails):
+            for d in self.__tails.get(node, ()):
+                low, high = self.__child_box(low, high, d)
+        return low, high
+
+    def __can_split(self, node : int) -> bool:
+        return (self.__count[node] > self.__max_points_in_bucket) and (self.__depth[node] < self.__max_depth)
+
+    def __children(self, node : int) -> list[int]:
+        base = self.__child_base[node]
+        return self.__child_slots[base:base + self.__mask[node].bit_count()]
+
+    def __child(self, node : int, direction : int) -> int:
+        """
+        Номер ребёнка в заданном направлении или -1
+        """
+        mask = self.__mask[node]
+        if (not (mask >> direction) & 1):
+            return -1
+        return self.__child_slots[self.__child_base[node] + (mask & ((1 << direction) - 1)).bit_count()]
+
+    def __path(self, node : int) -> list[tuple[int, tuple[float, ...], tuple[float, ...]]]:
+        """
+        Узлы от корня до заданного вместе с их границами
+        """
+        chain : list[int] = []
+        while node >= 0:
+            chain.append(node)
+            node = self.__parent[node]
+        chain.reverse()
+        low, high = self.__low, self.__high
+        path = [(chain[0], low, high)]
+        for node in chain[1:]:
+            low, high = self.__box_of(node, low, high)
+            path.append((node, low, high))
+        return path
+
+    def __new_node(self, parent : int, direction : int, depth : int) -> int:
+        if self.__free:
+            node = self.__free.pop()
+            self.__parent[node] = parent
+            self.__direction[node] = direction
+            self.__depth[node] = depth
+            self.__contents[node] = []
+            self.__summary[node] = None
+            return node
+        self.__parent.append(parent)
+        self.__direction.append(direction)
+        self.__depth.append(depth)
+        self.__count.append(0)
+        self.__mask.append(0)
+        self.__child_base.append(0)
+        self.__contents.append([])
+        self.__version.append(0)
+        self.__summary.append(None)
+        return len(self.__parent) - 1
+
+    def __free_node(self, node : int) -> None:
+        self.__parent[node] = NodeArena.FREE
+        self.__count[node] = 0
+        self.__mask[node] = 0
+        self.__contents[node] = None
+        self.__tails.pop(node, None)
+        self.__version[node] += 1
+        self.__summary[node] = None
+        self.__free.append(node)
+        return
+
+    def __set_children(self, node : int, children : dict[int, int]) -> None:
+        """
+        Записать блок детей узла (направление -> номер) в конец таблицы детей
+        Старый блок становится мусором; когда мусора больше половины, таблица уплотняется
+        """
+        self.__version[node] += 1
+        self.__garbage += self.__mask[node].bit_count()
+        self.__mask[node] = 0
+        if (self.__garbage > 64) and (2*self.__garbage > len(self.__child_slots)):
+            self.__compact()
+        mask : int = 0
+        self.__child_base[node] = len(self.__child_slots)
+        for d in sorted(children):
+            mask |= 1 << d
+            self.__child_slots.append(children[d])
+        self.__mask[node] = mask
+        return
+
+    def __compact(self) -> None:
+        slots : list[int] = []
+        for node, mask in enumerate(self.__mask):
+            if (mask):
+                base = self.__child_base[node]
+                self.__child_base[node] = len(slots)
+                slots.extend(self.__child_slots[base:base + mask.bit_count()])
+        self.__child_slots = slots
+        self.__garbage = 0
+        return
+
+    def __add_child(self, node : int, direction : int) -> int:
+        children = {self.__direction[c]: c for c in self.__children(node)}
+        child = self.__new_node(node, direction, self.__depth[node] + 1)
+        children[direction] = child
+        self.__set_children(node, children)
+        return child
+
+    def __child_for(self, node : int, low : tuple[float, ...], high : tuple[float, ...],
+                    point : Point) -> tuple[int, tuple[float, ...], tuple[float, ...]]:
+        """
+        Ребёнок внутреннего узла, в который должна попасть точка, и его границы
+        Недостающий ребёнок создаётся, сжатый лист, не содержащий точку, расширяется,
+        перед сжатым внутренним ребёнком вставляется промежуточный узел (см. Node.__subnode_for)
+        """
+        d = self.__point_direction(low, high, point)
+        box = (low, high)
+        low, high = self.__child_box(low, high, d)
+        child = self.__child(node, d)
+        if (child < 0):
+            return self.__add_child(node, d), low, high
+        tail = self.__tails.get(child) if self.__tails else None
+        if (tail is None):
+            return child, low, high
+        for i, step in enumerate(tail):
+            if (self.__point_direction(low, high, point) != step):
+                if (self.__contents[child] is not None):
+                    del self.__tails[child]
+                    self.__depth[child] = self.__depth[node] + 1
+                    self.__version[child] += 1
+                    self.__version[node] += 1
+                    return (child,) + self.__child_box(*box, d)
+                middle = self.__new_node(node, d, self.__depth[node] + 1 + i)
+                if (i > 0):
+                    self.__tails[middle] = tail[:i]
+                self.__count[middle] = self.__count[child]
+                self.__contents[middle] = None
+                self.__parent[child] = middle
+                self.__direction[child] = step
+                if (i + 1 < len(tail)):
+                    self.__tails[child] = tail[i + 1:]
+                else:
+                    del self.__tails[child]
+                mask = self.__mask[node]
+                self.__child_slots[self.__child_base[node] + (mask & ((1 << d) - 1)).bit_count()] = middle
+                self.__version[node] += 1
+                self.__set_children(middle, {step: child})
+                return middle, low, high
+            low, high = self.__child_box(low, high, step)
+        return child, low, high
+
+    def __set_contents(self, node : int, contents : list[Content]) -> None:
+        self.__version[node] += 1
+        self.__contents[node] = contents
+        for i, c in enumerate(contents):
+            c.locate(node, i)
+        return
+
+    def __swap_remove(self, leaf : int, content : Content) -> None:
+        self.__version[leaf] += 1
+        contents = self.__contents[leaf]
+        i = content.slot()
+        last = contents.pop()
+        if (last is not content):
+            contents[i] = last
+            last.locate(leaf, i)
+        return
+
+    def __split(self, node : int, low : tuple[float, ...], high : tuple[float, ...],
+                contents : list[Content]) -> None:
+        """
+        Сделать лист внутренним и разложить данные по вновь созданным детям
+        Ребёнок, который сам будет разбит, сразу получает наименьшую ячейку с его данными
+        """
+        stack = [(node, low, high, contents)]
+        while stack:
+            node, low, high, contents = stack.pop()
+            self.__contents[node] = None
+            mid = [(2**i, (a + b)/2) for i, (a, b) in enumerate(zip(low, high))]
+            groups : dict[int, list[Content]] = {}
+            for c in contents:
+                d : int = 0
+                for x, (n, m) in zip(c.point(), mid):
+                    if (x >= m):
+                        d += n
+                group = groups.get(d)
+                if (group is None):
+                    groups[d] = [c]
+                else:
+                    group.append(c)
+            children : dict[int, int] = {}
+            for d, group in groups.items():
+                c_low, c_high = self.__child_box(low, high, d)
+                depth = self.__depth[node] + 1
+                tail : list[int] = []
+                if (len(group) > self.__max_points_in_bucket):
+                    while depth < self.__max_depth:
+                        directions = {self.__point_direction(c_low, c_high, c.point()) for c in group}
+                        if (len(directions) != 1):
+                            break
+                        step = directions.pop()
+                        tail.append(step)
+                        c_low, c_high = self.__child_box(c_low, c_high, step)
+                        depth += 1
+                child = self.__new_node(node, d, depth)
+                if (tail):
+                    self.__tails[child] = tuple(tail)
+                children[d] = child
+                self.__count[child] = len(group)
+                if (self.__can_split(child)):
+                    stack.append((child, c_low, c_high, group))
+                else:
+                    self.__set_contents(child, group)
+            self.__set_children(node, children)
+        return
+
+    def __collapse(self, node : int) -> None:
+        """
+        Сделать узел листом, собрав в него все данные поддерева
+        """
+        contents : list[Content] = []
+        stack = self.__children(node)
+        while stack:
+            n = stack.pop()
+            leaf_contents = self.__contents[n]
+            if (leaf_contents is not None):
+                contents.extend(leaf_contents)
+            else:
+                stack.extend(self.__children(n))
+                self.__garbage += self.__mask[n].bit_count()
+            self.__free_node(n)
+        self.__garbage += self.__mask[node].bit_count()
+        self.__mask[node] = 0
+        self.__set_contents(node, contents)
+        return
+
+    def get_areas(self) -> list[Cuboid]:
+        areas : list[Cuboid] = []
+        stack = [(0, self.__low, self.__high)]
+        while stack:
+            node, low, high = stack.pop()
+            areas.append(Cuboid(Point(low), Point(high)))
+            stack.extend(self.__expand((node, low, high)))
+        return areas
+
+    def get_contents(self) -> list[Content]:
+        return list(self.iter_contents())
+
+    def iter_contents(self) -> Iterator[Content]:
+        return self.__iter_subtree(0)
+
+    def __iter_subtree(self, node : int) -> Iterator[Content]:
+        stack : list[int] = [node]
+        while stack:
+            node = stack.pop()
+            contents = self.__contents[node]
+            if (contents is not None):
+                yield from contents
+            else:
+                stack.extend(self.__children(node))
+        return
+
+    def flatten(self) -> FlatTree:
+        """
+        Разложить дерево в плоские массивы (см. Node.flatten)
+        """
+        flat = FlatTree(len(self.__low), self.__max_points_in_bucket)
+        first_content : dict[int, int] = {}
+        stack : list[int] = [0]
+        while stack:
+            node = stack.pop()
+            first_content[node] = len(flat.contents)
+            contents = self.__contents[node]
+            if (contents is not None):
+                flat.contents.extend(contents)
+            else:
+                stack.extend(self.__children(node))
+        nodes = [(0, self.__low, self.__high)]
+        i = 0
+        while i < len(nodes):
+            node, low, high = nodes[i]
+            i += 1
+            children = self.__children(node)
+            flat.boxes.extend(low)
+            flat.boxes.extend(high)
+            flat.first_child.append(len(nodes))
+            flat.child_count.append(len(children))
+            flat.first_content.append(first_content[node])
+            flat.contents_count.append(self.__count[node])
+            for child in children:
+                nodes.append((child, *self.__box_of(child, low, high)))
+        return flat
+
+    def grow(self, point : Point) -> "NodeArena":
+        """
+        Расширить область дерева до точки (см. Node.grow)
+        Корень всегда остаётся узлом 0, старый корень переносится в новый узел;
+        если удвоений было несколько, путь к нему от его ячейки хранится в __tails
+        """
+        area = self.__area
+        # направления, в которых каждая область лежит в следующей, удвоенной
+        steps : list[int] = []
+        aligned = True
+        while not area.contains(point):
+            larger, d = area.enclosing(point)
+            aligned = aligned and larger.subarea(d).same(area)
+            steps.append(d)
+            area = larger
+        if (not steps):
+            return self
+        if (self.__contents[0] is not None):
+            self.__set_area(area)
+        elif (aligned):
+            child = self.__new_node(0, steps[-1], 0)
+            if (len(steps) > 1):
+                self.__tails[child] = tuple(reversed(steps[:-1]))
+            self.__count[child] = self.__count[0]
+            self.__summary[child] = self.__summary[0]
+            self.__summary[0] = None
+            self.__mask[child] = self.__mask[0]
+            self.__child_base[child] = self.__child_base[0]
+            self.__contents[child] = None
+            for c in self.__children(child):
+                self.__parent[c] = child
+            self.__mask[0] = 0
+            self.__set_children(0, {steps[-1]: child})
+            self.__set_area(area)
+        else:
+            contents = self.get_contents()
+            self.__set_area(area)
+            self.__clear()
+            self.load_contents(contents)
+        return self
+
+    def shrink(self) -> "NodeArena":
+        """
+        Сузить область дерева (см. Node.shrink)
+        """
+        while (self.__contents[0] is None) and (self.__mask[0].bit_count() == 1):
+            child = self.__children(0)[0]
+            low, high = self.__box_of(child, self.__low, self.__high)
+            self.__depth[0] = self.__depth[child]
+            self.__garbage += 1
+            self.__mask[0] = self.__mask[child]
+            self.__child_base[0] = self.__child_base[child]
+            for c in self.__children(0):
+                self.__parent[c] = 0
+            contents = self.__contents[child]
+            self.__contents[0] = None
+            if (contents is not None):
+                self.__set_contents(0, contents)
+            self.__summary[0] = self.__summary[child]
+            self.__free_node(child)
+            self.__set_area(Cuboid(Point(low), Point(high)))
+        return self
+
+    def add_content(self, content : Content) -> None:
+        point = content.point()
+        node = 0
+        low, high = self.__low, self.__high
+        while True:
+            self.__count[node] += 1
+            self.__summary[node] = None
+            contents = self.__contents[node]
+            if (contents is not None):
+                break
+            node, low, high = self.__child_for(node, low, high, point)
+        self.__version[node] += 1
+        content.locate(node, len(contents))
+        contents.append(content)
+        if (self.__can_split(node)):
+            self.__split(node, low, high, contents)
+        return
+
+    def load_contents(self, contents : list[Content]) -> None:
+        assert self.__count[0] == 0
+        self.__count[0] = len(contents)
+        if (self.__can_split(0)):
+            self.__split(0, self.__low, self.__high, contents)
+        else:
+            self.__set_contents(0, contents)
+        return
+
+    def delete_content(self, content : Content) -> None:
+        leaf = content.leaf()
+        self.__swap_remove(leaf, content)
+        node = leaf
+        while node >= 0:
+            self.__count[node] -= 1
+            self.__summary[node] = None
+            node = self.__parent[node]
+        self.__rebalance([], [leaf])
+        return
+
+    def move_contents(self, moves : Iterable[tuple[Content, Point]]) -> None:
+        """
+        Переместить пакет данных (см. Node.relocate_content)
+        Границы листа вычисляются по пути от корня
+        """
+        overfull : list[int] = []
+        vacated : list[int] = []
+        for content, point in moves:
+            leaf = content.leaf()
+            path = self.__path(leaf)
+            for node, _, _ in path:
+                self.__summary[node] = None
+            _, low, high = path[-1]
+            if (self.__contains(low, high, point)):
+                content.move(point)
+                self.__version[leaf] += 1
+                continue
+            self.__swap_remove(leaf, content)
+            content.move(point)
+            vacated.append(leaf)
+            while not self.__contains(path[-1][1], path[-1][2], point):
+                self.__count[path.pop()[0]] -= 1
+            node, low, high = path[-1]
+            while self.__contents[node] is None:
+                node, low, high = self.__child_for(node, low, high, point)
+                self.__count[node] += 1
+                self.__summary[node] = None
+            self.__version[node] += 1
+            content.locate(node, len(self.__contents[node]))
+            self.__contents[node].append(content)
+            if (self.__can_split(node)):
+                overfull.append(node)
+        if overfull or vacated:
+            self.__rebalance(overfull, vacated)
+        return
+
+    def __rebalance(self, overfull : list[int], vacated : list[int]) -> None:
+        """
+        Выполнить отложенные слияния и разбиения узлов (см. Node.rebalance)
+        """
+        for leaf in vacated:
+            if (self.__parent[leaf] == NodeArena.FREE):
+                continue
+            top = -1
+            node = leaf
+            while node >= 0:
+                if (self.__contents[node] is None) and (self.__count[node] <= self.__max_points_in_bucket):
+                    top = node
+                node = self.__parent[node]
+            if (top >= 0):
+                self.__collapse(top)
+        # номера освобождённых узлов могут быть заняты при разбиениях, поэтому отбираются заранее
+        overfull = [leaf for leaf in overfull if self.__parent[leaf] != NodeArena.FREE]
+        for leaf in overfull:
+            contents = self.__contents[leaf]
+            if (contents is not None) and (self.__can_split(leaf)):
+                _, low, high = self.__path(leaf)[-1]
+                self.__split(leaf, low, high, contents)
+        return
+
+    def is_current(self, visited : list[tuple[int, int]]) -> bool:
+        """
+        Не изменился ли ни один из узлов с момента, когда были записаны их версии
+        """
+        version = self.__version
+        for node, v in visited:
+            if (version[node] != v):
+                return False
+        return True
+
+    def find_data_closest(self, point : Point, closest : ClosestContent, trace : QueryTrace | None = None,
+                          visited : list[tuple[int, int]] | None = None) -> None:
+        """
+        Найти ближайшие данные обходом "лучший-первым" (см. Node.find_data_closest)
+        """
+        queue = [(self.__min_distance2(self.__low, self.__high, point), 0, 0, self.__low, self.__high)]
+        pushed : int = 1
+        while queue:
+            d2, _, node, low, high = heapq.heappop(queue)
+            if (d2 >= closest.prune_distance2()) or closest.exhausted(d2):
+                if (trace is not None):
+                    trace.prunes += len(queue) + 1
+                break
+            if (trace is not None):
+                trace.nodes_visited += 1
+            if (visited is not None):
+                visited.append((node, self.__version[node]))
+            contents = self.__contents[node]
+            if (contents is not None):
+                count = closest.admit(d2, len(contents))
+                if (count < len(contents)):
+                    contents = contents[:count]
+                if (trace is not None):
+                    trace.leaves_scanned += 1
+                    trace.distance_evaluations += count
+                for content in contents:
+                    closest.push(content.point().distance2(point), content)
+            else:
+                for child in self.__children(node):
+                    c_low, c_high = self.__box_of(child, low, high)
+                    sd2 = self.__min_distance2(c_low, c_high, point)
+                    if (sd2 < closest.prune_distance2()):
+                        heapq.heappush(queue, (sd2, pushed, child, c_low, c_high))
+                        pushed += 1
+                    elif (trace is not None):
+                        trace.prunes += 1
+        return
+
+    def iter_in_radius(self, point : Point, radius : float, trace : QueryTrace | None = None,
+                       visited : list[tuple[int, int]] | None = None) -> Iterator[Content]:
+        radius2 = radius*radius
+        stack = [(0, self.__low, self.__high)]
+        while stack:
+            node, low, high = stack.pop()
+            if (self.__min_distance2(low, high, point) > radius2):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            contents = self.__contents[node]
+            if (visited is not None):
+                visited.append((node, self.__version[node]))
+            elif (self.__max_distance2(low, high, point) <= radius2):
+                yield from self.__iter_subtree(node)
+                continue
+            if (contents is None):
+                stack.extend(self.__expand((node, low, high)))
+            else:
+                if (trace is not None):
+                    trace.leaves_scanned += 1
+                    trace.distance_evaluations += len(contents)
+                for c in contents:
+                    if (c.point().distance2(point) <= radius2):
+                        yield c
+        return
+
+    @staticmethod
+    def __intersects(low : tuple[float, ...], high : tuple[float, ...], box : Cuboid) -> bool:
+        for c_min, c_max, o_min, o_max in zip(low, high, box.point_min(), box.point_max()):
+            if (c_min >= o_max) or (o_min >= c_max):
+                return False
+        return True
+
+    @staticmethod
+    def __inside(low : tuple[float, ...], high : tuple[float, ...], box : Cuboid) -> bool:
+        for c_min, c_max, o_min, o_max in zip(low, high, box.point_min(), box.point_max()):
+            if (c_min < o_min) or (c_max > o_max):
+                return False
+        return True
+
+    def iter_in_box(self, box : Cuboid, trace : QueryTrace | None = None) -> Iterator[Content]:
+        stack = [(0, self.__low, self.__high)]
+        while stack:
+            node, low, high = stack.pop()
+            if (not self.__intersects(low, high, box)):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            contents = self.__contents[node]
+            if (self.__inside(low, high, box)):
+                yield from self.__iter_subtree(node)
+            elif (contents is None):
+                stack.extend(self.__expand((node, low, high)))
+            else:
+                if (trace is not None):
+                    trace.leaves_scanned += 1
+                for c in contents:
+                    if (box.contains(c.point())):
+                        yield c
+        return
+
+    def __fold(self, region : Region, covered : Callable[[int], Any], lift : Callable[[Content], Any],
+               combine : Callable[[Any, Any], Any], value : Any, trace : QueryTrace | None = None) -> Any:
+        """
+        Общий обход подсчёта и агрегатов (см. Node.__fold), covered получает номер узла
+        """
+        stack = [(0, self.__low, self.__high)]
+        while stack:
+            node, low, high = stack.pop()
+            if (region.disjoint(low, high)):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            contents = self.__contents[node]
+            if (region.covers(low, high)):
+                value = combine(value, covered(node))
+            elif (contents is None):
+                stack.extend(self.__expand((node, low, high)))
+            else:
+                if (trace is not None):
+                    trace.leaves_scanned += 1
+                    if (region.distances):
+                        trace.distance_evaluations += len(contents)
+                for c in contents:
+                    if (region.contains(c.point())):
+                        value = combine(value, lift(c))
+        return value
+
+    def count_in_box(self, box : Cuboid, trace : QueryTrace | None = None) -> int:
+        return self.__fold(Region.box(box), self.__count.__getitem__, lambda c: 1, add, 0, trace)
+
+    def count_in_radius(self, point : Point, radius : float, trace : QueryTrace | None = None) -> int:
+        return self.__fold(Region.radius(point, radius), self.__count.__getitem__, lambda c: 1, add, 0, trace)
+
+    def summary(self, monoid : Monoid, node : int = 0) -> Any:
+        """
+        Агрегат всех данных поддерева (см. Node.summary)
+        """
+        if (self.__summary[node] is None):
+            order : list[int] = []
+            stack : list[int] = [node]
+            while stack:
+                n = stack.pop()
+                order.append(n)
+                if (self.__contents[n] is None):
+                    stack.extend(child for child in self.__children(n) if self.__summary[child] is None)
+            for n in reversed(order):
+                value = monoid.identity
+                contents = self.__contents[n]
+                if (contents is not None):
+                    for c in contents:
+                        value = monoid.combine(value, monoid.lift(c.point(), c.data()))
+                else:
+                    for child in self.__children(n):
+                        value = monoid.combine(value, self.__summary[child])
+                self.__summary[n] = value
+        return self.__summary[node]
+
+    def aggregate_in_box(self, box : Cuboid, monoid : Monoid, trace : QueryTrace | None = None) -> Any:
+        return self.__fold(Region.box(box), lambda node: self.summary(monoid, node),
+                           lambda c: monoid.lift(c.point(), c.data()), monoid.combine, monoid.identity, trace)
+
+    def aggregate_in_radius(self, point : Point, radius : float, monoid : Monoid,
+                            trace : QueryTrace | None = None) -> Any:
+        return self.__fold(Region.radius(point, radius), lambda node: self.summary(monoid, node),
+                           lambda c: monoid.lift(c.point(), c.data()), monoid.combine, monoid.identity, trace)
+
+    def pairs_within(self, radius : float, trace : QueryTrace | None = None) -> list[tuple[Content, Content]]:
+        """
+        Найти все пары данных на расстоянии не больше radius, каждую пару один раз (см. Node.pairs_within)
+        """
+        r2 = radius*radius
+        pairs : list[tuple[Content, Content]] = []
+        root = (0, self.__low, self.__high)
+        stack = [(root, root)]
+        while stack:
+            a, b = stack.pop()
+            if (a[0] == b[0]):
+                if (trace is not None):
+                    trace.nodes_visited += 1
+                contents = self.__contents[a[0]]
+                if (contents is not None):
+                    if (trace is not None):
+                        trace.leaves_scanned += 1
+                        trace.distance_evaluations += len(contents)*(len(contents) - 1)//2
+                    for i, ci in enumerate(contents):
+                        pi = ci.point()
+                        for cj in contents[i + 1:]:
+                            if (pi.distance2(cj.point()) <= r2):
+                                pairs.append((ci, cj))
+                else:
+                    children = self.__expand(a)
+                    for i, si in enumerate(children):
+                        stack.append((si, si))
+                        for sj in children[i + 1:]:
+                            stack.append((si, sj))
+                continue
+            d2 : float = 0.0
+            for a_min, a_max, b_min, b_max in zip(a[1], a[2], b[1], b[2]):
+                if (b_min > a_max):
+                    d2 += (b_min - a_max)*(b_min - a_max)
+                elif (a_min > b_max):
+                    d2 += (a_min - b_max)*(a_min - b_max)
+            if (d2 > r2):
+                if (trace is not None):
+                    trace.prunes += 1
+                continue
+            if (trace is not None):
+                trace.nodes_visited += 1
+            a_contents = self.__contents[a[0]]
+            b_contents = self.__contents[b[0]]
+            if (a_contents is not None) and (b_contents is not None):
+                if (trace is not None):
+                    trace.leaves_scanned += 2
+                    trace.distance_evaluations += len(a_contents)*len(b_contents)
+                for ca in a_contents:
+                    pa = ca.point()
+                    for cb in b_contents:
+                        if (pa.distance2(cb.point()) <= r2):
+                            pairs.append((ca, cb))
+            elif (a_contents is not None) or ((b_contents is None) and (self.__count[b[0]] > self.__count[a[0]])):
+                for sb in self.__expand(b):
+                    stack.append((a, sb))
+            else:
+                for sa in self.__expand(a):
+                    stack.append((sa, b))
+        return pairs
+
+    def __expand(self, item : "tuple[int, tuple, tuple]") -> "list[tuple[int, tuple, tuple]]":
+        """
+        Дети узла вместе с их границами
+        """
+        node, low, high = item
+        return [(child, *self.__box_of(child, low, high)) for child in self.__children(node)]
+
+    def find_data_closest_many(self, queries : "np.ndarray", n : int, block_size : int = 256,
+                               trace : QueryTrace | None = None) -> list[list[Any]]:
+        """
+        Пакетный поиск ближайших выполняется как последовательность одиночных запросов
+        """
+        closest_many : list[list[Any]] = []
+        for q in queries.tolist():
+            closest = ClosestContent(n)
+            self.find_data_closest(Point(q), closest, trace)
+            closest_many.append([c.data() for c in closest.contents()])
+        return closest_many
+
+    def get_in_radius_many(self, queries : "np.ndarray", radius : float, block_size : int = 256,
+                           trace : QueryTrace | None = None) -> list[list[Any]]:
+        """
+        Пакетный поиск в окрестностях выполняется как последовательность одиночных запросов
+        """
+        return [[c.data() for c in self.iter_in_radius(Point(q), radius, trace)] for q in queries.tolist()]
+
+class Tree:
+    """
+    Класс дерева для хранения пространственных данных
+    """
+    def __init__(self, dimension : int, p1 : Position, p2 : Position, max_points_in_bucket : int,
+                 tracer : Tracer | None = None, engine : str = "node", thread_safe : bool = False,
+                 shrink : bool = False, max_depth : int = 64, cache_size : int = 0,
+                 aggregate : Monoid | None = None) -> None:
+        """
+        p1, p2 - точки, ограничивающие область хранения
+        max_points_in_bucket - наибольшее количество точек, которое может храниться в листе дерева
+        tracer - трассировщик стоимости запросов (по умолчанию отключён)
+        engine - представление узлов: "node" - граф объектов Node,
+                 "arena" - параллельные массивы NodeArena
+        thread_safe - защитить дерево блокировкой ReadWriteLock: запросы из разных потоков
+                      выполняются одновременно, изменения - по одному и без запросов
+        shrink - сужать область после удалений и перемещений, пока у корня единственный подузел
+        max_depth - наибольшая глубина деления; лист этой глубины не разбивается
+                    и хранит сколько угодно данных (например, совпадающие точки)
+        cache_size - сколько результатов find_data_closest и get_data_in_radius хранить
+                     в кэше QueryCache (0 - без кэша)
+        aggregate - агрегат, хранящийся в узлах для aggregate_in_box и aggregate_in_radius
+        Область расширяется сама, когда данные добавляются или перемещаются за её пределы
+        """
+        self.__dimension = dimension
+        p1 = Point(p1)
+        p2 = Point(p2)
+        assert p1.dimension() == self.__dimension
+        assert p1.dimension() == p2.dimension()
+        if (engine == "node"):
+            self.__root : Node | NodeArena = Node(max_points_in_bucket, Cuboid(p1, p2), -1, max_depth=max_depth)
+        elif (engine == "arena"):
+            self.__root = NodeArena(max_points_in_bucket, Cuboid(p1, p2), max_depth)
+        else:
+            raise ValueError(f"unknown engine {engine}")
+        # индекс данных: данные -> Content, который знает свой лист и позицию в нём
+        self.__points : dict[Any, Content] = {}
+        self.__tracer = tracer
+        self.__shrink = shrink
+        self.__cache = QueryCache(cache_size) if cache_size > 0 else None
+        self.__aggregate = aggregate
+        if (thread_safe):
+            lock = ReadWriteLock()
+            self.__reader : "LockGuard | nullcontext" = lock.reader()
+            self.__writer : "LockGuard | nullcontext" = lock.writer()
+        else:
+            self.__reader = nullcontext()
+            self.__writer = self.__reader
+        return
+
+    @classmethod
+    def from_points(cls, points : Iterable[Position], data : Iterable[Any], max_points_in_bucket : int,
+                    p1 : Position | None = None, p2 : Position | None = None,
+                    tracer : Tracer | None = None, engine : str = "node", thread_safe : bool = False,
+                    shrink : bool = False, max_depth : int = 64, cache_size : int = 0,
+                    aggregate : Monoid | None = None) -> "Tree":
+        """
+        Построить дерево сразу по набору точек
+        points - координаты, последовательность точек или массив NumPy формы (n, d)
+        data - данные, соответствующие точкам
+        p1, p2 - точки, ограничивающие область хранения; если не заданы, берётся
+                 наименьший параллелепипед, содержащий все точки
+        engine, thread_safe, shrink, max_depth, cache_size, aggregate - как в конструкторе
+        """
+        if hasattr(points, "tolist"):
+            points = points.tolist()
+        points = [Point(p) for p in points]
+        data = list(data)
+        assert len(points) == len(data)
+        if (p1 is None) or (p2 is None):
+            assert len(points) > 0
+            c_min = [min(p[i] for p in points) for i in range(points[0].dimension())]
+            c_max = [max(p[i] for p in points) for i in range(points[0].dimension())]
+            # верхняя граница области не входит в неё
+            for i in range(len(c_max)):
+                span = (c_max[i] - c_min[i]) or 1.0
+                c_max[i] = max(c_max[i] + span*1e-9, math.nextafter(c_max[i], math.inf))
+            p1 = c_min if p1 is None else p1
+            p2 = c_max if p2 is None else p2
+        p1 = Point(p1)
+        tree = cls(p1.dimension(), p1, p2, max_points_in_bucket, tracer, engine, thread_safe,
+                   shrink=shrink, max_depth=max_depth, cache_size=cache_size, aggregate=aggregate)
+        tree.__load([Content(p, d) for p, d in zip(points, data)])
+        return tree
+
+    def __load(self, contents : list[Content]) -> None:
+        for c in contents:
+            assert c.point().dimension() == self.__dimension
+            self.__cover(c.point())
+            assert c.data() not in self.__points
+            self.__points[c.data()] = c
+        self.__root.load_contents(contents)
+        return
+
+    def __str__(self) -> str:
+        return f"2N_TREE dim={self.__dimension} root={self.__root}"
+
+    def get_points(self) -> list[Point]:
+        """
+        Получить все координаты хранящихся в дереве данных
+        """
+        with self.__reader:
+            return [c.point() for c in self.__points.values()]
+
+    def find_data_closest(self, point : Position, n : int) -> list[Any]:
+        """
+        Найти несколько данных, наиболее близких к точке
+        """
+        assert n > 0
+        if type(point) is not Point:
+            point = Point(point)
+        with self.__reader:
+            if (self.__cache is None):
+                return self.__find_closest(point, n)
+            key = ("find_data_closest", point, n)
+            found = self.__cache.get(key, self.__root.is_current)
+            if (found is None):
+                visited : list[tuple[Any, int]] = []
+                found = tuple(self.__find_closest(point, n, visited))
+                self.__cache.put(key, found, visited)
+            return list(found)
+
+    def __find_closest(self, point : Point, n : int, visited : list[tuple[Any, int]] | None = None) -> list[Any]:
+        closest = ClosestContent(n)
+        if (self.__tracer is None):
+            self.__root.find_data_closest(point, closest, None, visited)
+        else:
+            trace = self.__tracer.begin("find_data_closest")
+            self.__root.find_data_closest(point, closest, trace, visited)
+            self.__tracer.end(trace)
+        return [c.data() for c in closest.contents()]
+
+    def find_data_closest_approx(self, point : Position, n : int, epsilon : float = 0.0,
+                                 max_leaves : int | None = None,
+                                 max_evaluations : int | None = None) -> ApproximateClosest:
+        """
+        Приближённо найти несколько данных, наиболее близких к точке
+        epsilon - не просматривать области дальше (n-го найденного)/(1 + epsilon);
+                  тогда каждый найденный не дальше (1 + epsilon) расстояний до истинного
+        max_leaves - наибольшее количество просмотренных листьев
+        max_evaluations - наибольшее количество вычисленных расстояний до точек
+        Возвращает найденное вместе с достигнутой гарантией bound (см. ApproximateClosest):
+        при исчерпании бюджета она может оказаться хуже 1 + epsilon или отсутствовать
+        """
+        assert n > 0
+        assert epsilon >= 0.0
+        if type(point) is not Point:
+            point = Point(point)
+        closest = ClosestContent(n, epsilon=epsilon, max_leaves=max_leaves, max_evaluations=max_evaluations)
+        with self.__reader:
+            if (self.__tracer is None):
+                self.__root.find_data_closest(point, closest)
+            else:
+                trace = self.__tracer.begin("find_data_closest_approx")
+                self.__root.find_data_closest(point, closest, trace)
+                self.__tracer.end(trace)
+            return ApproximateClosest([c.data() for c in closest.contents()], closest.distances(),
+                                      closest.bound(), closest.leaves, closest.evaluations)
+
+    def get_data_in_radius(self, point : Position, radius : float) -> list[Any]:
+        """
+        Найти все данные в круговой окрестности
+        """
+        with self.__reader:
+            if type(point) is not Point:
+                point = Point(point)
+            if (self.__cache is None):
+                return self.__in_radius(point, radius)
+            key = ("get_data_in_radius", point, radius)
+            found = self.__cache.get(key, self.__root.is_current)
+            if (found is None):
+                visited : list[tuple[Any, int]] = []
+                found = tuple(self.__in_radius(point, radius, visited))
+                self.__cache.put(key, found, visited)
+            return list(found)
+
+    def __in_radius(self, point : Point, radius : float, visited : list[tuple[Any, int]] | None = None) -> list[Any]:
+        if (self.__tracer is None):
+            return [c.data() for c in self.__root.iter_in_radius(point, radius, None, visited)]
+        trace = self.__tracer.begin("get_data_in_radius")
+        in_radius = [c.data() for c in self.__root.iter_in_radius(point, radius, trace, visited)]
+        self.__tracer.end(trace)
+        return in_radius
+
+    def cache_stats(self) -> CacheStats | None:
+        """
+        Счётчики кэша запросов (None, если кэш не включён)
+        """
+        if (self.__cache is None):
+            return None
+        return self.__cache.stats()
+
+    def clear_cache(self) -> None:
+        """
+        Очистить кэш запросов
+        """
+        if (self.__cache is not None):
+            self.__cache.clear()
+        return
+
+    def iter_data_in_radius(self, point : Position, radius : float) -> Iterator[Any]:
+        """
+        Перебирать данные в круговой окрестности по мере нахождения
+        Перебор можно прервать досрочно (например, "есть ли хоть одна точка ближе r?").
+        Дерево нельзя изменять, пока перебор не завершён
+        """
+        with self.__reader:
+            if type(point) is not Point:
+                point = Point(point)
+            if (self.__tracer is None):
+                for c in self.__root.iter_in_radius(point, radius):
+                    yield c.data()
+                return
+            trace = self.__tracer.begin("iter_data_in_radius")
+            try:
+                for c in self.__root.iter_in_radius(point, radius, trace):
+                    yield c.data()
+            finally:
+                self.__tracer.end(trace)
+            return
+
+    def get_data_in_box(self, p_min : Position, p_max : Position) -> list[Any]:
+        """
+        Найти все данные в прямоугольной области
+        p_min, p_max - углы области; как и у области дерева, верхняя граница в неё не входит
+        """
+        with self.__reader:
+            box = Cuboid(Point(p_min), Point(p_max))
+            if (self.__tracer is None):
+                return [c.data() for c in self.__root.iter_in_box(box)]
+            trace = self.__tracer.begin("get_data_in_box")
+            in_box = [c.data() for c in self.__root.iter_in_box(box, trace)]
+            self.__tracer.end(trace)
+            return in_box
+
+    def count_in_box(self, p_min : Position, p_max : Position) -> int:
+        """
+        Подсчитать данные в прямоугольной области, не перебирая поддеревья, лежащие в ней целиком
+        """
+        with self.__reader:
+            box = Cuboid(Point(p_min), Point(p_max))
+            if (self.__tracer is None):
+                return self.__root.count_in_box(box)
+            trace = self.__tracer.begin("count_in_box")
+            count = self.__root.count_in_box(box, trace)
+            self.__tracer.end(trace)
+            return count
+
+    def count_in_radius(self, point : Position, radius : float) -> int:
+        """
+        Подсчитать данные в круговой окрестности, не перебирая поддеревья, лежащие в ней целиком
+        """
+        with self.__reader:
+            if type(point) is not Point:
+                point = Point(point)
+            if (self.__tracer is None):
+                return self.__root.count_in_radius(point, radius)
+            trace = self.__tracer.begin("count_in_radius")
+            count = self.__root.count_in_radius(point, radius, trace)
+            self.__tracer.end(trace)
+            return count
+
+    def aggregate_in_box(self, p_min : Position, p_max : Position) -> Any:
+        """
+        Агрегат (см. Tree(..., aggregate=...)) данных в прямоугольной области
+        Для поддеревьев, лежащих в ней целиком, берётся хранящийся в узле агрегат
+        """
+        assert self.__aggregate is not None
+        with self.__reader:
+            box = Cuboid(Point(p_min), Point(p_max))
+            if (self.__tracer is None):
+                return self.__root.aggregate_in_box(box, self.__aggregate)
+            trace = self.__tracer.begin("aggregate_in_box")
+            value = self.__root.aggregate_in_box(box, self.__aggregate, trace)
+            self.__tracer.end(trace)
+            return value
+
+    def aggregate_in_radius(self, point : Position, radius : float) -> Any:
+        """
+        Агрегат (см. Tree(..., aggregate=...)) данных в круговой окрестности
+        Для поддеревьев, лежащих в ней целиком, берётся хранящийся в узле агрегат
+        """
+        assert self.__aggregate is not None
+        with self.__reader:
+            if type(point) is not Point:
+                point = Point(point)
+            if (self.__tracer is None):
+                return self.__root.aggregate_in_radius(point, radius, self.__aggregate)
+            trace = self.__tracer.begin("aggregate_in_radius")
+            value = self.__root.aggregate_in_radius(point, radius, self.__aggregate, trace)
+            self.__tracer.end(trace)
+            return value
+
+    def pairs_within(self, radius : float) -> list[tuple[Any, Any]]:
+        """
+        Найти все пары данных на расстоянии не больше radius друг от друга
+        Каждая пара возвращается один раз
+        """
+        with self.__reader:
+            if (self.__tracer is None):
+                pairs = self.__root.pairs_within(radius)
+            else:
+                trace = self.__tracer.begin("pairs_within")
+                pairs = self.__root.pairs_within(radius, trace)
+                self.__tracer.end(trace)
+            return [(a.data(), b.data()) for a, b in pairs]
+
+    def iter_contents(self) -> Iterator[Content]:
+        """
+        Перебрать все хранящиеся данные вместе с их координатами
+        Дерево нельзя изменять, пока перебор не завершён
+        """
+        with self.__reader:
+            yield from self.__root.iter_contents()
+        return
+
+    def find_data_closest_many(self, points : Iterable[Position], n : int, workers : int = 1,
+                               chunk_size : int | None = None) -> list[list[Any]]:
+        """
+        Найти для каждой точки из набора несколько наиболее близких к ней данных
+        points - последовательность точек или массив NumPy формы (m, d)
+        workers - количество процессов; больше 1 - дерево сохраняется во временный файл,
+                  который процессы пула отображают в память, а пакет делится на части
+                  по chunk_size точек (см. parallel_queries). Пакет, который пул
+                  не окупит (см. parallel_pays_off), выполняется в этом процессе
+        Без NumPy выполняется как последовательность одиночных запросов
+        Если точки не образуют массив формы (m, d), возбуждается ValueError
+        """
+        assert n > 0
+        queries = batch_queries(points, self.__dimension)
+        if parallel_pays_off(len(queries), workers, self.__parallel_overhead()):
+            return self.__parallel_queries("closest", queries, n, workers, chunk_size)
+        if (np is None):
+            return [self.find_data_closest(p, n) for p in queries]
+        with self.__reader:
+            if (self.__tracer is None):
+                return self.__root.find_data_closest_many(queries, n)
+            trace = self.__tracer.begin("find_data_closest_many")
+            closest = self.__root.find_data_closest_many(queries, n, trace=trace)
+            self.__tracer.end(trace)
+            return closest
+
+    def get_data_in_radius_many(self, points : Iterable[Position], radius : float, workers : int = 1,
+                                chunk_size : int | None = None) -> list[list[Any]]:
+        """
+        Найти для каждой точки из набора все данные в её круговой окрестности
+        points - последовательность точек или массив NumPy формы (m, d)
+        workers, chunk_size - см. find_data_closest_many
+        Без NumPy выполняется как последовательность одиночных запросов
+        Если точки не образуют массив формы (m, d), возбуждается ValueError
+        """
+        queries = batch_queries(points, self.__dimension)
+        if parallel_pays_off(len(queries), workers, self.__parallel_overhead()):
+            return self.__parallel_queries("radius", queries, radius, workers, chunk_size)
+        if (np is None):
+            return [self.get_data_in_radius(p, radius) for p in queries]
+        with self.__reader:
+            if (self.__tracer is None):
+                return self.__root.get_in_radius_many(queries, radius)
+            trace = self.__tracer.begin("get_data_in_radius_many")
+            in_radius = self.__root.get_in_radius_many(queries, radius, trace=trace)
+            self.__tracer.end(trace)
+            return in_radius
+
+    def save(self, path : str) -> None:
+        """
+        Сохранить дерево в файл в двоичном формате FrozenTree
+        Данные сохраняются через pickle
+        """
+        with self.__reader:
+            flat = self.__root.flatten()
+            with open(path, "wb") as f:
+                FrozenTree.dump(flat, f)
+            return
+
+    def snapshot(self) -> "FrozenTree":
+        """
+        Снимок дерева только для чтения
+        Плоские массивы копируются в памяти под блокировкой чтения, после чего снимок
+        не зависит от дерева: длинные запросы к нему видят согласованное состояние,
+        пока дерево изменяется. Сами данные не копируются: снимок хранит ссылки на них
+        """
+        with self.__reader:
+            flat = self.__root.flatten()
+            coordinates = array("d")
+            for c in flat.contents:
+                coordinates.extend(c.point())
+        return FrozenTree.from_flat(flat, coordinates)
+
+    @classmethod
+    def load(cls, path : str, mmap : bool = True, tracer : Tracer | None = None,
+             engine : str = "node", thread_safe : bool = False, shrink : bool = False,
+             max_depth : int = 64, cache_size : int = 0, aggregate : Monoid | None = None) -> "Tree | FrozenTree":
+        """
+        Загрузить дерево, сохранённое Tree.save
+        mmap - отобразить файл в память и вернуть FrozenTree только для чтения,
+               который отвечает на запросы прямо из буферов файла;
+               иначе прочитать файл и построить изменяемое дерево Tree
+        tracer, engine, thread_safe, shrink, max_depth, cache_size, aggregate - как в конструкторе
+                 изменяемого дерева; при mmap не используются
+        """
+        frozen = FrozenTree.open(path, mmap)
+        if (mmap):
+            return frozen
+        with frozen:
+            p1, p2 = frozen.area()
+            tree = cls.from_points(frozen.get_points(), frozen.get_data(), frozen.max_points_in_bucket(),
+                                   p1, p2, tracer, engine, thread_safe, shrink=shrink, max_depth=max_depth,
+                                   cache_size=cache_size, aggregate=aggregate)
+        return tree
+
+    def __parallel_overhead(self) -> int:
+        """
+        Накладные расходы параллельного пакета в запросах: пул и сохранение снимка
+        """
+        return PARALLEL_BREAK_EVEN + len(self.__points)//PARALLEL_SAVED_POINTS_PER_QUERY
+
+    def __parallel_queries(self, kind : str, points : Iterable[Position], argument : Any,
+                           workers : int, chunk_size : int | None) -> list[list[Any]]:
+        """
+        Выполнить пакет запросов в пуле процессов над временным снимком дерева
+        Для повторяющихся пакетов дешевле один раз сохранить дерево и открыть его через Tree.load
+        """
+        fd, path = tempfile.mkstemp(suffix=".bitree")
+        os.close(fd)
+        try:
+            self.save(path)
+            if (self.__tracer is None):
+                return parallel_queries(path, kind, points, argument, workers, chunk_size)
+            trace = self.__tracer.begin(f"parallel_{kind}")
+            results = parallel_queries(path, kind, points, argument, workers, chunk_size)
+            self.__tracer.end(trace)
+            return results
+        finally:
+            os.remove(path)
+
+    def _get_areas(self) -> list[Cuboid]:
+        """
+        Получить все окрестности, которые используются для построения дерева
+        """
+        with self.__reader:
+            return self.__root.get_areas()
+
+    def add_content(self, point : Position, data : Any) -> None:
+        """
+        Добавить данные
+        """
+        if type(point) is not Point:
+            point = Point(point)
+        with self.__writer:
+            self.__cover(point)
+            assert data not in self.__points
+            c = Content(point, data)
+            self.__points[c.data()] = c
+            self.__root.add_content(c)
+            return
+
+    def del_data(self, data : Any) -> None:
+        """
+        Удалить данные
+        """
+        with self.__writer:
+            content = self.__points.pop(data)
+            self.__root.delete_content(content)
+            if (self.__shrink):
+                self.__shrink_root()
+            return
+
+    def move_data(self, data : Any, point : Position) -> None:
+        """
+        Переместить данные
+        """
+        self.move_many([(data, point)])
+        return
+
+    def move_many(self, updates : Iterable[tuple[Any, Position]]) -> None:
+        """
+        Переместить сразу много данных
+        updates - пары (данные, новое положение)
+        Каждое перемещение начинается с текущего листа и поднимается к предкам только
+        при пересечении границы; разбиение и слияние узлов выполняются в конце пакета
+        """
+        updates = [(data, point if type(point) is Point else Point(point)) for data, point in updates]
+        with self.__writer:
+            for _, point in updates:
+                self.__cover(point)
+            self.__root.move_contents((self.__points[data], point) for data, point in updates)
+            if (self.__shrink):
+                self.__shrink_root()
+            return
+
+    def shrink(self) -> None:
+        """
+        Сузить область дерева, пока у корня единственный подузел
+        """
+        with self.__writer:
+            self.__shrink_root()
+            return
+
+    def __shrink_root(self) -> None:
+        """
+        Сузить область; кэш запросов, полученных в прежней области, сбрасывается
+        """
+        area = self.__root.area()
+        self.__root = self.__root.shrink()
+        if (self.__cache is not None) and (not self.__root.area().same(area)):
+            self.__cache.clear()
+        return
+
+    def __cover(self, point : Point) -> None:
+        """
+        Расширить область дерева, если точка лежит за её пределами
+        Вне прежней области запросы не просматривали узлов, поэтому кэш сбрасывается
+        """
+        if (not self.__root.area().contains(point)):
+            assert all(math.isfinite(c) for c in point)
+            self.__root = self.__root.grow(point)
+            if (self.__cache is not None):
+                self.__cache.clear()
+        return
+
+@dataclass
+class Motion:
+    """
+    Линейное движение данных
+    point - положение в момент time
+    velocity - скорость (смещение за единицу времени)
+    time - момент, к которому отнесено положение
+    stamp - номер последнего обновления, по нему отбрасываются устаревшие сроки в очереди
+    """
+    point : Point
+    velocity : Point
+    time : float
+    stamp : int
+
+    def position(self, t : float) -> Point:
+        """
+        Положение в момент t
+        """
+        dt = t - self.time
+        return Point([c + v*dt for c, v in zip(self.point, self.velocity)])
+
+class KineticTree:
+    """
+    Дерево движущихся с постоянной скоростью данных
+    В дереве Tree каждые данные хранятся в положении, отнесённом к моменту их последнего
+    обновления; пока они смещаются от него не дальше slack = max_speed*horizon, дерево
+    не изменяется. Это равносильно расширению областей узлов на slack: запросы
+    расширяются на наибольшее смещение и уточняются по точным положениям в момент запроса.
+    Данные переносятся в дереве, только когда выходят за этот запас или меняют скорость,
+    поэтому шаг времени стоит порядка количества таких событий. Пересечение границ ячеек
+    здесь ни при чём: данные со скоростью v переносятся раз в slack/v, так что шаг dt
+    переносит около n*dt/horizon из n данных, движущихся с наибольшей скоростью
+    """
+    # относительный допуск при проверке скорости на max_speed
+    SPEED_TOLERANCE = 1e-9
+
+    def __init__(self, dimension : int, p1 : Position, p2 : Position, max_points_in_bucket : int,
+                 max_speed : float, horizon : float, time : float = 0.0, engine : str = "node") -> None:
+        """
+        p1, p2, max_points_in_bucket, engine - как у Tree
+        max_speed - наибольшая скорость данных
+        horizon - время, за которое данные с наибольшей скоростью выходят за запас;
+                  больший horizon реже переносит данные, но расширяет запросы
+        time - начальный момент
+        """
+        assert max_speed >= 0.0
+        assert horizon >= 0.0
+        self.__tree = Tree(dimension, p1, p2, max_points_in_bucket, engine=engine)
+        self.__dimension = dimension
+        self.__max_speed : float = max_speed
+        self.__slack : float = max_speed*horizon
+        self.__time : float = time
+        self.__motions : dict[Any, Motion] = {}
+        # сроки выхода за запас: (момент, номер обновления, данные)
+        self.__expiry : list[tuple[float, int, Any]] = []
+        self.__stamp : int = 0
+        return
+
+    def __str__(self) -> str:
+        return f"KINETIC_TREE time={self.__time} slack={self.__slack} tree={self.__tree}"
+
+    def time(self) -> float:
+        """
+        Текущий момент
+        """
+        return self.__time
+
+    def position(self, data : Any, t : float | None = None) -> Point:
+        """
+        Положение данных в момент t (по умолчанию - в текущий)
+        """
+        return self.__motions[data].position(self.__time if t is None else t)
+
+    def velocity(self, data : Any) -> Point:
+        return self.__motions[data].velocity
+
+    def add_content(self, point : Position, data : Any, velocity : Position) -> None:
+        """
+        Добавить данные, находящиеся в point в текущий момент
+        """
+        assert data not in self.__motions
+        velocity = self.__checked_velocity(velocity)
+        point = Point(point)
+        self.__tree.add_content(point, data)
+        self.__motions[data] = self.__start(data, point, velocity)
+        return
+
+    def del_data(self, data : Any) -> None:
+        """
+        Удалить данные
+        """
+        del self.__motions[data]
+        self.__tree.del_data(data)
+        return
+
+    def move_data(self, data : Any, point : Position, velocity : Position | None = None) -> None:
+        """
+        Переместить данные в point в текущий момент, при необходимости сменив скорость
+        """
+        if (velocity is None):
+            velocity = self.__motions[data].velocity
+        else:
+            velocity = self.__checked_velocity(velocity)
+        point = Point(point)
+        self.__tree.move_data(data, point)
+        self.__motions[data] = self.__start(data, point, velocity)
+        return
+
+    def set_velocity(self, data : Any, velocity : Position) -> None:
+        """
+        Сменить скорость данных в текущий момент
+        """
+        self.move_data(data, self.position(data), velocity)
+        return
+
+    def advance(self, t : float) -> None:
+        """
+        Перейти к моменту t (не раньше текущего)
+        Переносятся только данные, вышедшие за запас; они получают положение в момент t
+        """
+        assert t >= self.__time
+        self.__time = t
+        updates : list[tuple[Any, Point]] = []
+        while self.__expiry and (self.__expiry[0][0] < t):
+            _, stamp, data = heapq.heappop(self.__expiry)
+            motion = self.__motions.get(data)
+            if (motion is None) or (motion.stamp != stamp):
+                continue
+            point = motion.position(t)
+            updates.append((data, point))
+            self.__motions[data] = self.__start(data, point, motion.velocity)
+        if updates:
+            self.__tree.move_many(updates)
+        return
+
+    def get_data_in_radius(self, point : Position, radius : float, t : float | None = None) -> list[Any]:
+        """
+        Найти все данные, находящиеся в круговой окрестности в момент t (по умолчанию - в текущий)
+        """
+        point = Point(point)
+        t = self.__time if t is None else t
+        radius2 = radius*radius
+        in_radius : list[Any] = []
+        for data in self.__tree.iter_data_in_radius(point, radius + self.__drift(t)):
+            if (self.__motions[data].position(t).distance2(point) <= radius2):
+                in_radius.append(data)
+        return in_radius
+
+    def find_data_closest(self, point : Position, n : int, t : float | None = None) -> list[Any]:
+        """
+        Найти n данных, ближайших к точке в момент t (по умолчанию - в текущий)
+        Ближайшие по хранящимся положениям дают верхнюю оценку расстояния до n-го,
+        по ней выбираются все кандидаты, которые затем сравниваются по точным положениям
+        """
+        assert n > 0
+        point = Point(point)
+        t = self.__time if t is None else t
+        nearest = self.__tree.find_data_closest(point, n)
+        if (not nearest):
+            return []
+        bound = max(self.__motions[data].position(t).distance(point) for data in nearest)
+        # сами nearest тоже кандидаты: из-за округления радиус может их не захватить
+        candidates : dict[Any, float] = {}
+        for data in chain(nearest, self.__tree.iter_data_in_radius(point, bound + self.__drift(t))):
+            if (data not in candidates):
+                candidates[data] = self.__motions[data].position(t).distance2(point)
+        return heapq.nsmallest(n, candidates, key=candidates.__getitem__)
+
+    def __drift(self, t : float) -> float:
+        """
+        Наибольшее отклонение положений в момент t от хранящихся в дереве
+        """
+        return self.__slack + self.__max_speed*(1.0 + KineticTree.SPEED_TOLERANCE)*abs(t - self.__time)
+
+    def __checked_velocity(self, velocity : Position) -> Point:
+        """
+        Проверить скорость до изменения дерева
+        Скорость, равная max_speed, но собранная, например, из cos и sin, может
+        превысить её на погрешность округления, поэтому сравнение ведётся с допуском
+        """
+        velocity = Point(velocity)
+        assert velocity.dimension() == self.__dimension
+        limit = self.__max_speed*(1.0 + KineticTree.SPEED_TOLERANCE)
+        assert sum(v*v for v in velocity) <= limit*limit
+        return velocity
+
+    def __start(self, data : Any, point : Point, velocity : Point) -> Motion:
+        """
+        Отнести движение к текущему моменту и поставить в очередь срок выхода за запас
+        """
+        speed = math.sqrt(sum(v*v for v in velocity))
+        self.__stamp += 1
+        if (speed > 0.0):
+            heapq.heappush(self.__expiry, (self.__time + self.__slack/speed, self.__stamp, data))
+        return Motion(point, velocity, self.__time, self.__stamp)
+
+class FrozenTree:
+    """
+    Неизменяемое дерево в компактном двоичном представлении
+    Файл: заголовок, затем плоские массивы FlatTree (float64 и int64, little-endian),
+    затем координаты данных, смещения данных и сами данные, каждое сохранённое
+    через pickle отдельно.
+    Запросы отвечаются прямо из буферов, без создания узлов Node и Content,
+    поэтому отображённый в память файл открывается быстро и разделяется процессами
+    через страничный кэш. Данные распаковываются только для найденных точек,
+    заново при каждом запросе: процессы не держат собственных копий всей таблицы,
+    зато повторно возвращаемые данные - каждый раз новые объекты.
+    Дерево в памяти (from_flat, Tree.snapshot) хранит вместо них ссылки на сами данные
+    """
+    MAGIC = b"BITREE\x00\x02"
+    HEADER = struct.Struct("<8sIIQQQQ")
+
+    def __init__(self, buffer : "bytes | mmap_module.mmap", path : str | None = None) -> None:
+        """
+        buffer - содержимое файла, записанного FrozenTree.dump
+        path - файл, из которого получен буфер (нужен для параллельных запросов)
+        """
+        if (sys.byteorder != "little"):
+            raise ValueError("FrozenTree buffers are little-endian")
+        self.__buffer = buffer
+        self.__path = path
+        self.__view = memoryview(buffer)
+        magic, dimension, bucket, nodes, points, payload_offset, payload_size = \
+            FrozenTree.HEADER.unpack_from(self.__view, 0)
+        if (magic != FrozenTree.MAGIC):
+            raise ValueError("not a bi_tree file")
+        self.__dimension : int = dimension
+        self.__max_points_in_bucket : int = bucket
+        self.__points : int = points
+        offset = FrozenTree.HEADER.size
+        views : list[memoryview] = []
+        for code, count in (("d", 2*nodes*dimension), ("q", nodes), ("q", nodes), ("q", nodes), ("q", nodes),
+                            ("d", points*dimension), ("q", points + 1)):
+            views.append(self.__view[offset:offset + 8*count].cast(code))
+            offset += 8*count
+        self.__boxes, self.__first_child, self.__child_count, self.__first_content, \
+            self.__contents_count, self.__coordinates, self.__data_offsets = views
+        self.__payload = self.__view[payload_offset:payload_offset + payload_size]
+        # у дерева в памяти (см. from_flat) - сами данные вместо payload
+        self.__data : list[Any] | None = None
+        return
+
+    @classmethod
+    def from_flat(cls, flat : FlatTree, coordinates : "array | None" = None) -> "FrozenTree":
+        """
+        Дерево в памяти поверх копий плоских массивов, без записи в файловый формат
+        Данные не сериализуются: запросы возвращают те же объекты, что хранятся во flat
+        coordinates - уже собранные координаты данных (см. Tree.snapshot)
+        """
+        if (coordinates is None):
+            coordinates = array("d")
+            for c in flat.contents:
+                coordinates.extend(c.point())
+        tree = cls.__new__(cls)
+        tree.__buffer = None
+        tree.__path = None
+        tree.__view = None
+        tree.__dimension = flat.dimension
+        tree.__max_points_in_bucket = flat.max_points_in_bucket
+        tree.__points = len(flat.contents)
+        tree.__boxes, tree.__first_child, tree.__child_count, tree.__first_content, \
+            tree.__contents_count, tree.__coordinates = \
+            [memoryview(a) for a in (array("d", flat.boxes), array("q", flat.first_child),
+                                     array("q", flat.child_count), array("q", flat.first_content),
+                                     array("q", flat.contents_count), coordinates)]
+        tree.__data_offsets = None
+        tree.__payload = None
+        tree.__data = [c.data() for c in flat.contents]
+        return tree
+
+    @staticmethod
+    def dump(flat : FlatTree, f : Any) -> None:
+        """
+        Записать плоское дерево в открытый двоичный файл
+        """
+        coordinates = array("d")
+        for c in flat.contents:
+            coordinates.extend(c.point())
+        items = [pickle.dumps(c.data(), protocol=pickle.HIGHEST_PROTOCOL) for c in flat.contents]
+        data_offsets = array("q", [0])
+        for item in items:
+            data_offsets.append(data_offsets[-1] + len(item))
+        payload = b"".join(items)
+        arrays = [array("d", flat.boxes), array("q", flat.first_child), array("q", flat.child_count),
+                  array("q", flat.first_content), array("q", flat.contents_count), coordinates, data_offsets]
+        payload_offset = FrozenTree.HEADER.size + sum(a.itemsize*len(a) for a in arrays)
+        f.write(FrozenTree.HEADER.pack(FrozenTree.MAGIC, flat.dimension, flat.max_points_in_bucket,
+                                       len(flat.child_count), len(flat.contents), payload_offset, len(payload)))
+        for a in arrays:
+            if (sys.byteorder != "little"):
+                a.byteswap()
+            f.write(a.tobytes())
+        f.write(payload)
+        return
+
+    @classmethod
+    def open(cls, path : str, mmap : bool = True) -> "FrozenTree":
+        """
+        Открыть файл, записанный Tree.save
+        mmap - отобразить файл в память вместо чтения целиком
+        """
+        with open(path, "rb") as f:
+            if (mmap):
+                buffer = mmap_module.mmap(f.fileno(), 0, access=mmap_module.ACCESS_READ)
+            else:
+                buffer = f.read()
+        return cls(buffer, path)
+
+    def close(self) -> None:
+        """
+        Освободить буферы; после этого дерево нельзя использовать
+        """
+        for view in (self.__boxes, self.__first_child, self.__child_count, self.__first_content,
+                     self.__contents_count, self.__coordinates, self.__data_offsets, self.__payload,
+                     self.__view):
+            if (view is not None):
+                view.release()
+        self.__data = None
+        if isinstance(self.__buffer, mmap_module.mmap):
+            self.__buffer.close()
+        return
+
+    def __enter__(self) -> "FrozenTree":
+        return self
+
+    def __exit__(self, *exc : Any) -> None:
+        self.close()
+        return
+
+    def __str__(self) -> str:
+        return f"FROZEN_TREE dim={self.__dimension} nodes={len(self.__child_count)} points={self.__points}"
+
+    def __len__(self) -> int:
+        return self.__points
+
+    def dimension(self) -> int:
+        return self.__dimension
+
+    def max_points_in_bucket(self) -> int:
+        return self.__max_points_in_bucket
+
+    def __item(self, index : int) -> Any:
+        """
+        Распаковать данные точки с номером index
+        """
+        if (self.__data is not None):
+            return self.__data[index]
+        offsets = self.__data_offsets
+        return pickle.loads(self.__payload[offsets[index]:offsets[index + 1]])
+
+    def __items(self, start : int, stop : int) -> list[Any]:
+        """
+        Распаковать данные точек с номерами из [start, stop)
+        """
+        if (self.__data is not None):
+            return self.__data[start:stop]
+        offsets = self.__data_offsets
+        payload = self.__payload
+        return [pickle.loads(payload[offsets[i]:offsets[i + 1]]) for i in range(start, stop)]
+
+    def area(self) -> tuple[Point, Point]:
+        """
+        Углы области хранения
+        """
+        d = self.__dimension
+        return Point(self.__boxes[0:d]), Point(self.__boxes[d:2*d])
+
+    def get_points(self) -> list[Point]:
+        """
+        Получить все координаты хранящихся данных
+        """
+        d = self.__dimension
+        coordinates = self.__coordinates
+        return [Point(coordinates[i:i + d]) for i in range(0, len(coordinates), d)]
+
+    def get_data(self) -> list[Any]:
+        """
+        Получить все хранящиеся данные в порядке get_points
+        """
+        return self.__items(0, self.__points)
+
+    def path(self) -> str | None:
+        """
+        Файл, из которого открыто дерево
+        """
+        return self.__path
+
+    def __min_distance2(self, node : int, point : Point) -> float:
+        """
+        Квадрат наименьшего расстояния от точки до области узла
+        """
+        d = self.__dimension
+        boxes = self.__boxes
+        base = 2*d*node
+        distance2 = 0.0
+        for i in range(d):
+            x = point[i]
+            low = boxes[base + i]
+            if (x < low):
+                distance2 += (low - x)*(low - x)
+                continue
+            high = boxes[base + d + i]
+            if (x > high):
+                distance2 += (x - high)*(x - high)
+        return distance2
+
+    def __max_distance2(self, node : int, point : Point) -> float:
+        """
+        Квадрат наибольшего расстояния от точки до области узла
+        """
+        d = self.__dimension
+        boxes = self.__boxes
+        base = 2*d*node
+        distance2 = 0.0
+        for i in range(d):
+            x = point[i]
+            delta = max(x - boxes[base + i], boxes[base + d + i] - x)
+            distance2 += delta*delta
+        return distance2
+
+    def __distance2(self, index : int, point : Point) -> float:
+        coordinates = self.__coordinates
+        base = index*self.__dimension
+        distance2 = 0.0
+        for i, x in enumerate(point):
+            delta = coordinates[base + i] - x
+            distance2 += delta*delta
+        return distance2
+
+    def find_data_closest(self, point : Position, n : int) -> list[Any]:
+        """
+        Найти несколько данных, наиболее близких к точке, обходом "лучший-первым"
+        """
+        assert n > 0
+        closest = ClosestContent(n)
+        self.__find_closest(point, closest)
+        return [self.__item(index) for index in closest.contents()]
+
+    def find_data_closest_approx(self, point : Position, n : int, epsilon : float = 0.0,
+                                 max_leaves : int | None = None,
+                                 max_evaluations : int | None = None) -> ApproximateClosest:
+        """
+        Приближённый поиск ближайших (см. Tree.find_data_closest_approx)
+        """
+        assert n > 0
+        assert epsilon >= 0.0
+        closest = ClosestContent(n, epsilon=epsilon, max_leaves=max_leaves, max_evaluations=max_evaluations)
+        self.__find_closest(point, closest)
+        return ApproximateClosest([self.__item(index) for index in closest.contents()], closest.distances(),
+                                  closest.bound(), closest.leaves, closest.evaluations)
+
+    def __find_closest(self, point : Position, closest : ClosestContent) -> None:
+        if type(point) is not Point:
+            point = Point(point)
+        assert point.dimension() == self.__dimension
+        queue : list[tuple[float, int]] = [(self.__min_distance2(0, point), 0)]
+        while queue:
+            d2, node = heapq.heappop(queue)
+            if (d2 >= closest.prune_distance2()) or closest.exhausted(d2):
+                break
+            count = self.__child_count[node]
+            if (count == 0):
+                start = self.__first_content[node]
+                stop = start + closest.admit(d2, self.__contents_count[node])
+                for index in range(start, stop):
+                    closest.push(self.__distance2(index, point), index)
+            else:
+                start = self.__first_child[node]
+                for child in range(start, start + count):
+                    sd2 = self.__min_distance2(child, point)
+                    if (sd2 < closest.prune_distance2()):
+                        heapq.heappush(queue, (sd2, child))
+        return
+
+    def get_data_in_radius(self, point : Position, radius : float) -> list[Any]:
+        """
+        Найти все данные в круговой окрестности
+        Данные узлов, целиком лежащих в окрестности, берутся отрезком без проверки каждой точки
+        """
+        if type(point) is not Point:
+            point = Point(point)
+        assert point.dimension() == self.__dimension
+        radius2 = radius*radius
+        in_radius : list[Any] = []
+        stack : list[int] = [0]
+        while stack:
+            node = stack.pop()
+            if (self.__min_distance2(node, point) > radius2):
+                continue
+            start = self.__first_content[node]
+            stop = start + self.__contents_count[node]
+            if (self.__max_distance2(node, point) <= radius2):
+                in_radius.extend(self.__items(start, stop))
+                continue
+            count = self.__child_count[node]
+            if (count == 0):
+                for index in range(start, stop):
+                    if (self.__distance2(index, point) <= radius2):
+                        in_radius.append(self.__item(index))
+            else:
+                child = self.__first_child[node]
+                stack.extend(range(child, child + count))
+        return in_radius
+
+    def find_data_closest_many(self, points : Iterable[Position], n : int, workers : int = 1,
+                               chunk_size : int | None = None) -> list[list[Any]]:
+        """
+        Найти для каждой точки из набора несколько наиболее близких к ней данных
+        workers - количество процессов; больше 1 - запросы делятся на части
+                  по chunk_size точек и выполняются в пуле процессов, каждый из которых
+                  отображает в память тот же файл (дерево должно быть открыто из файла).
+                  Пакет, который пул не окупит (см. parallel_pays_off), выполняется в этом процессе
+        С NumPy пакет обрабатывается общим обходом, как в Node.find_data_closest_many,
+        иначе - последовательностью одиночных запросов
+        """
+        assert n > 0
+        queries = batch_queries(points, self.__dimension)
+        if parallel_pays_off(len(queries), workers):
+            assert self.__path is not None
+            return parallel_queries(self.__path, "closest", queries, n, workers, chunk_size)
+        if (np is None):
+            return [self.find_data_closest(p, n) for p in queries]
+        return self.__closest_many(queries, n)
+
+    def get_data_in_radius_many(self, points : Iterable[Position], radius : float, workers : int = 1,
+                                chunk_size : int | None = None) -> list[list[Any]]:
+        """
+        Найти для каждой точки из набора все данные в её круговой окрестности
+        workers, chunk_size - см. find_data_closest_many
+        """
+        queries = batch_queries(points, self.__dimension)
+        if parallel_pays_off(len(queries), workers):
+            assert self.__path is not None
+            return parallel_queries(self.__path, "radius", queries, radius, workers, chunk_size)
+        if (np is None):
+            return [self.get_data_in_radius(p, radius) for p in queries]
+        return self.__in_radius_many(queries, radius)
+
+    def __arrays(self) -> tuple["np.ndarray", "np.ndarray"]:
+        """
+        Области узлов формы (nodes, 2, d) и координаты данных формы (points, d)
+        как массивы NumPy поверх буферов; не сохраняются в объекте, чтобы close
+        мог освободить буферы
+        """
+        d = self.__dimension
+        boxes = np.frombuffer(self.__boxes, dtype=np.float64).reshape(-1, 2, d)
+        coordinates = np.frombuffer(self.__coordinates, dtype=np.float64).reshape(-1, d)
+        return boxes, coordinates
+
+    def __in_radius_many(self, queries : "np.ndarray", radius : float, block_size : int = 256) -> list[list[Any]]:
+        """
+        Пакетный поиск в окрестностях (см. Node.get_in_radius_many)
+        Данные поддерева лежат отрезком, поэтому его блок - срез массива координат
+        """
+        boxes, coordinates = self.__arrays()
+        results : list[list[Any]] = [[] for _ in range(len(queries))]
+        r2 = radius*radius
+        stack : list[tuple[int, np.ndarray]] = [(0, np.arange(len(queries)))]
+        while stack:
+            node, active = stack.pop()
+            q = queries[active]
+            d = np.maximum(boxes[node, 0] - q, 0.0) + np.maximum(q - boxes[node, 1], 0.0)
+            near = np.einsum("ij,ij->i", d, d) <= r2
+            if (not near.all()):
+                active = active[near]
+                q = q[near]
+            count = self.__contents_count[node]
+            if (len(active) == 0) or (count == 0):
+                continue
+            if (self.__child_count[node] == 0) or (count <= block_size):
+                start = self.__first_content[node]
+                diff = q[:, None, :] - coordinates[None, start:start + count, :]
+                hits = np.einsum("ijk,ijk->ij", diff, diff) <= r2
+                for i in np.flatnonzero(hits.any(axis=1)).tolist():
+                    results[active[i]].extend(self.__item(start + j) for j in np.flatnonzero(hits[i]).tolist())
+            else:
+                child = self.__first_child[node]
+                stack.extend((c, active) for c in range(child, child + self.__child_count[node]))
+        return results
+
+    def __closest_many(self, queries : "np.ndarray", n : int, block_size : int = 256) -> list[list[Any]]:
+        """
+        Пакетный поиск ближайших (см. Node.find_data_closest_many): сначала каждый запрос
+        просматривает блок, содержащий его точку, затем общий обход в глубину
+        """
+        boxes, coordinates = self.__arrays()
+        m = len(queries)
+        best_d2 = np.full((m, n), np.inf)
+        # найденные данные хранятся своими номерами в файле
+        best = np.full((m, n), -1, dtype=np.int64)
+        seeded = np.full(m, -1, dtype=np.int64)
+
+        def min_distance2(node : int, q : "np.ndarray") -> "np.ndarray":
+            d = np.maximum(boxes[node, 0] - q, 0.0) + np.maximum(q - boxes[node, 1], 0.0)
+            return np.einsum("ij,ij->i", d, d)
+
+        def merge(node : int, active : np.ndarray) -> None:
+            start = self.__first_content[node]
+            stop = start + self.__contents_count[node]
+            diff = queries[active][:, None, :] - coordinates[None, start:stop, :]
+            d2 = np.einsum("ijk,ijk->ij", diff, diff)
+            candidates_d2 = np.concatenate((best_d2[active], d2), axis=1)
+            candidates = np.concatenate((best[active], np.broadcast_to(np.arange(start, stop), d2.shape)), axis=1)
+            rows = np.arange(len(active))[:, None]
+            if (candidates_d2.shape[1] > n):
+                part = np.argpartition(candidates_d2, n - 1, axis=1)[:, :n]
+                candidates_d2 = candidates_d2[rows, part]
+                candidates = candidates[rows, part]
+            order = np.argsort(candidates_d2, axis=1)
+            best_d2[active] = candidates_d2[rows, order]
+            best[active] = candidates[rows, order]
+            return
+
+        stack : list[tuple[int, np.ndarray]] = [(0, np.arange(m))]
+        while stack:
+            node, active = stack.pop()
+            count = self.__contents_count[node]
+            if (count == 0):
+                continue
+            if (self.__child_count[node] == 0) or (count <= block_size):
+                merge(node, active)
+                seeded[active] = node
+                continue
+            q = queries[active]
+            child = self.__first_child[node]
+            for c in range(child, child + self.__child_count[node]):
+                inside = ((q >= boxes[c, 0]) & (q < boxes[c, 1])).all(axis=1)
+                if inside.any():
+                    stack.append((c, active[inside]))
+
+        stack = [(0, np.arange(m))]
+        while stack:
+            node, active = stack.pop()
+            q = queries[active]
+            near = min_distance2(node, q) < best_d2[active, -1]
+            if (not near.all()):
+                active = active[near]
+                q = q[near]
+            count = self.__contents_count[node]
+            if (len(active) == 0) or (count == 0):
+                continue
+            if (self.__child_count[node] == 0) or (count <= block_size):
+                active = active[seeded[active] != node]
+                if (len(active) > 0):
+                    merge(node, active)
+            else:
+                # ближайший к группе запросов узел кладётся в стек последним
+                child = self.__first_child[node]
+                children = list(range(child, child + self.__child_count[node]))
+                distances = [min_distance2(c, q).mean() for c in children]
+                for i in sorted(range(len(children)), key=lambda i: distances[i], reverse=True):
+                    stack.append((children[i], active))
+        return [[self.__item(index) for index in row if index >= 0] for row in best.tolist()]
+
+# накладные расходы пула процессов (запуск, открытие файла, пересылка пакета и результатов),
+# выраженные в числе запросов, которые за то же время выполняет один процесс
+PARALLEL_BREAK_EVEN = 5000
+# столько точек Tree сохраняет во временный файл за время одного запроса
+PARALLEL_SAVED_POINTS_PER_QUERY = 8
+
+def parallel_pays_off(queries : int, workers : int, overhead : int = PARALLEL_BREAK_EVEN) -> bool:
+    """
+    Окупает ли пул из workers процессов пакет из queries запросов
+    overhead - накладные расходы пула в запросах одного процесса
+    Пул из k процессов экономит долю (k - 1)/k времени пакета, поэтому пакет должен
+    быть не меньше overhead*k/(k - 1); процессов больше, чем ядер, не считается
+    """
+    workers = min(workers, os.cpu_count() or 1)
+    if (workers < 2):
+        return False
+    return queries*(workers - 1) >= overhead*workers
+
+# дерево, открытое в процессе-исполнителе parallel_queries
+_worker_tree : FrozenTree | None = None
+
+def _open_worker_tree(path : str) -> None:
+    """
+    Инициализатор процесса-исполнителя: отобразить файл дерева в память
+    """
+    global _worker_tree
+    _worker_tree = FrozenTree.open(path)
+    return
+
+def _run_worker_chunk(kind : str, chunk : "np.ndarray | list[Point]", argument : Any) -> list[list[Any]]:
+    if (kind == "closest"):
+        return _worker_tree.find_data_closest_many(chunk, argument)
+    return _worker_tree.get_data_in_radius_many(chunk, argument)
+
+def batch_queries(points : Iterable[Position], dimension : int) -> "np.ndarray | list[Point]":
+    """
+    Привести пакет точек к массиву NumPy формы (m, dimension), без NumPy - к списку Point
+    Если точки не образуют такого массива, возбуждается ValueError
+    """
+    if (np is None):
+        queries = [Point(p) for p in points]
+        if any(p.dimension() != dimension for p in queries):
+            raise ValueError(f"queries must have dimension {dimension}")
+        return queries
+    queries = np.asarray(points, dtype=float)
+    if (queries.size == 0):
+        queries = queries.reshape(0, dimension)
+    if (queries.ndim != 2) or (queries.shape[1] != dimension):
+        raise ValueError(f"queries must have shape (m, {dimension}), got {queries.shape}")
+    return queries
+
+def parallel_queries(path : str, kind : str, points : Iterable[Position], argument : Any,
+                     workers : int, chunk_size : int | None = None) -> list[list[Any]]:
+    """
+    Выполнить пакет запросов к файлу дерева в пуле процессов
+    kind - "closest" (argument - количество ближайших) или "radius" (argument - радиус)
+    chunk_size - количество точек в одном задании; по умолчанию по одному заданию
+                 на процесс: пакетный обход тем дешевле на запрос, чем больше пакет
+    Результаты возвращаются в порядке точек; данные приходят из процессов копиями.
+    Процессы отвечают на свои части пакетными запросами FrozenTree, то есть с NumPy
+    тем же векторным обходом, что и запрос в одном процессе
+    """
+    if (np is not None):
+        points = np.asarray(points, dtype=float)
+    else:
+        points = [Point(p) for p in points]
+    if (chunk_size is None):
+        chunk_size = max(1, math.ceil(len(points)/workers))
+    chunks = [points[i:i + chunk_size] for i in range(0, len(points), chunk_size)]
+    results : list[list[Any]] = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_open_worker_tree, initargs=(path,)) as pool:
+        for part in pool.map(_run_worker_chunk, repeat(kind), chunks, repeat(argument)):
+            results.extend(part)
+    return results
 
 if __name__ == "__main__":
     t = Tree(2, [0.0, 0.0], [1.0, 1.0], 3)
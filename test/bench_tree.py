@@ -0,0 +1,268 @@
+"""
+Headless benchmark of the Tree API.
+
+Runs reproducible seeded workloads (insert, bulk load, move, kNN, radius, delete)
+over uniform, clustered and degenerate point sets and reports ops/sec, per-op
+latency percentiles and peak memory. Results can be saved as JSON and compared
+with a previous run:
+
+    python test/bench_tree.py --output before.json
+    python test/bench_tree.py --output after.json --compare before.json
+
+Use --full for the whole matrix (sizes 10^3..10^6, dimensions 2..8).
+"""
+import argparse
+import json
+import math
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, field, asdict
+from typing import Any, Callable
+
+project_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_directory)
+from src.bi_tree import Tree
+
+DISTRIBUTIONS = ["uniform", "clustered", "degenerate"]
+KNN_N = 16
+RADIUS_HITS = 10
+MOVE_STEP = 0.01
+
+@dataclass
+class WorkloadResult:
+    """
+    Результат одной нагрузки; для пакетных операций задержки отдельных операций не известны
+    """
+    ops : int = 0
+    seconds : float = 0.0
+    ops_per_sec : float = 0.0
+    p50_us : float | None = None
+    p90_us : float | None = None
+    p99_us : float | None = None
+    error : str | None = None
+
+@dataclass
+class CaseResult:
+    distribution : str
+    dimension : int
+    size : int
+    bucket : int
+    workloads : dict[str, WorkloadResult] = field(default_factory=dict)
+    peak_memory_bytes : int | None = None
+    bytes_per_point : float | None = None
+
+    def key(self) -> str:
+        return f"{self.distribution}/d{self.dimension}/n{self.size}/b{self.bucket}"
+
+def generate_points(distribution : str, dimension : int, size : int, rnd : random.Random) -> list[list[float]]:
+    """
+    Точки в единичном кубе [0, 1)^dimension
+    uniform - равномерно; clustered - гауссовы сгустки;
+    degenerate - точки на диагонали с сеткой шага 1/256, то есть с множеством совпадающих
+    """
+    if (distribution == "uniform"):
+        return [[rnd.random() for _ in range(dimension)] for _ in range(size)]
+    if (distribution == "clustered"):
+        centers = [[rnd.random() for _ in range(dimension)] for _ in range(max(1, size // 1000))]
+        points = []
+        for _ in range(size):
+            c = rnd.choice(centers)
+            points.append([min(max(rnd.gauss(x, 0.01), 0.0), math.nextafter(1.0, 0.0)) for x in c])
+        return points
+    if (distribution == "degenerate"):
+        points = []
+        for _ in range(size):
+            t = rnd.randrange(256)/256
+            points.append([t]*dimension)
+        return points
+    raise ValueError(f"unknown distribution {distribution}")
+
+def radius_for(dimension : int, size : int) -> float:
+    """
+    Радиус шара, в который при равномерном распределении попадает около RADIUS_HITS точек
+    """
+    unit_ball = math.pi**(dimension/2)/math.gamma(dimension/2 + 1)
+    return (RADIUS_HITS/(size*unit_ball))**(1/dimension)
+
+def measure(ops : list[Callable[[], Any]]) -> WorkloadResult:
+    latencies : list[int] = []
+    start = time.perf_counter_ns()
+    for op in ops:
+        t = time.perf_counter_ns()
+        op()
+        latencies.append(time.perf_counter_ns() - t)
+    total = (time.perf_counter_ns() - start)/1e9
+    return summarize(latencies, len(ops), total)
+
+def measure_batch(ops : int, body : Callable[[], Any]) -> WorkloadResult:
+    start = time.perf_counter()
+    body()
+    seconds = time.perf_counter() - start
+    return WorkloadResult(ops=ops, seconds=seconds, ops_per_sec=(ops/seconds if seconds > 0 else 0.0))
+
+def summarize(latencies : list[int], ops : int, seconds : float) -> WorkloadResult:
+    latencies = sorted(latencies)
+    def percentile(p : float) -> float:
+        if not latencies:
+            return 0.0
+        return latencies[min(len(latencies) - 1, int(p*len(latencies)))]/1000
+    return WorkloadResult(ops=ops, seconds=seconds, ops_per_sec=(ops/seconds if seconds > 0 else 0.0),
+                          p50_us=percentile(0.5), p90_us=percentile(0.9), p99_us=percentile(0.99))
+
+def run_case(distribution : str, dimension : int, size : int, bucket : int, queries : int,
+             seed : int, memory : bool) -> CaseResult:
+    rnd = random.Random(f"{seed}/{distribution}/{dimension}/{size}")
+    points = generate_points(distribution, dimension, size, rnd)
+    p1 = [0.0]*dimension
+    p2 = [1.0]*dimension
+    case = CaseResult(distribution, dimension, size, bucket)
+
+    def guarded(name : str, body : Callable[[], WorkloadResult]) -> bool:
+        try:
+            case.workloads[name] = body()
+            return True
+        except (RecursionError, AssertionError) as e:
+            case.workloads[name] = WorkloadResult(error=f"{type(e).__name__}: {e}")
+            return False
+
+    tree = Tree(dimension, p1, p2, bucket)
+    if not guarded("insert", lambda: measure([lambda p=p, i=i: tree.add_content(p, i) for i, p in enumerate(points)])):
+        return case
+
+    guarded("bulk_load", lambda: measure_batch(size, lambda: Tree.from_points(points, range(size), bucket, p1, p2)))
+
+    query_points = [[rnd.random() for _ in range(dimension)] for _ in range(queries)]
+    guarded("knn", lambda: measure([lambda q=q: tree.find_data_closest(q, KNN_N) for q in query_points]))
+    radius = radius_for(dimension, size)
+    guarded("radius", lambda: measure([lambda q=q: tree.get_data_in_radius(q, radius) for q in query_points]))
+
+    def updates() -> list[tuple[int, list[float]]]:
+        moved = []
+        for i in rnd.sample(range(size), min(size, queries)):
+            points[i] = [min(max(x + rnd.uniform(-MOVE_STEP, MOVE_STEP), 0.0), math.nextafter(1.0, 0.0)) for x in points[i]]
+            moved.append((i, points[i]))
+        return moved
+    single = updates()
+    guarded("move", lambda: measure([lambda i=i, p=p: tree.move_data(i, p) for i, p in single]))
+    batch = updates()
+    guarded("move_many", lambda: measure_batch(len(batch), lambda: tree.move_many(batch)))
+
+    deleted = rnd.sample(range(size), min(size, queries))
+    guarded("delete", lambda: measure([lambda i=i: tree.del_data(i) for i in deleted]))
+
+    if memory:
+        del tree
+        tracemalloc.start()
+        try:
+            t = Tree(dimension, p1, p2, bucket)
+            for i, p in enumerate(points):
+                t.add_content(p, i)
+            _, peak = tracemalloc.get_traced_memory()
+            case.peak_memory_bytes = peak
+            case.bytes_per_point = peak/size
+        except (RecursionError, AssertionError):
+            pass
+        finally:
+            tracemalloc.stop()
+    return case
+
+def git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=project_directory,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_case(case : CaseResult) -> None:
+    print(case.key())
+    for name, w in case.workloads.items():
+        if w.error is not None:
+            print(f"  {name:10} FAILED {w.error}")
+        elif w.p50_us is None:
+            print(f"  {name:10} {w.ops_per_sec:12.0f} ops/s  (batch)")
+        else:
+            print(f"  {name:10} {w.ops_per_sec:12.0f} ops/s  p50 {w.p50_us:9.1f}us  p90 {w.p90_us:9.1f}us  p99 {w.p99_us:9.1f}us")
+    if case.bytes_per_point is not None:
+        print(f"  memory     peak {case.peak_memory_bytes} B, {case.bytes_per_point:.0f} B/point")
+    return
+
+def load_baseline(baseline_path : str, queries : int, seed : int) -> dict:
+    """
+    Прочитать результаты прошлого запуска; сравнивать можно только запуски
+    с одинаковыми --queries и --seed, иначе различаются сами нагрузки
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    meta = baseline["meta"]
+    if (meta.get("queries"), meta.get("seed")) != (queries, seed):
+        raise ValueError(f"{baseline_path} was run with --queries {meta.get('queries')} --seed {meta.get('seed')}, "
+                         f"not --queries {queries} --seed {seed}")
+    return baseline
+
+def compare(results : list[CaseResult], baseline : dict, baseline_path : str) -> None:
+    before = {}
+    for case in baseline["results"]:
+        key = f"{case['distribution']}/d{case['dimension']}/n{case['size']}/b{case['bucket']}"
+        for name, w in case["workloads"].items():
+            before[(key, name)] = w
+    print(f"comparison with {baseline_path} (revision {baseline['meta'].get('revision')}), ops/s ratio new/old:")
+    for case in results:
+        for name, w in case.workloads.items():
+            old = before.get((case.key(), name))
+            if (old is None) or (w.error is not None) or (old.get("error") is not None) or (old["ops_per_sec"] == 0):
+                continue
+            ratio = w.ops_per_sec/old["ops_per_sec"]
+            mark = "  REGRESSION" if ratio < 0.9 else ""
+            print(f"  {case.key():32} {name:10} {ratio:6.2f}x{mark}")
+    return
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000])
+    parser.add_argument("--dims", type=int, nargs="+", default=[2, 4, 8])
+    parser.add_argument("--buckets", type=int, nargs="+", default=[8, 32])
+    parser.add_argument("--distributions", nargs="+", choices=DISTRIBUTIONS, default=DISTRIBUTIONS)
+    parser.add_argument("--queries", type=int, default=1000, help="operations per query/move/delete workload")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--full", action="store_true", help="sizes 10^3..10^6, dimensions 2..8")
+    parser.add_argument("--no-memory", action="store_true", help="skip the tracemalloc pass")
+    parser.add_argument("--output", help="save results as JSON")
+    parser.add_argument("--compare", help="JSON of a previous run with the same --queries and --seed to compare ops/sec with")
+    args = parser.parse_args()
+    if args.full:
+        args.sizes = [1000, 10000, 100000, 1000000]
+        args.dims = list(range(2, 9))
+    baseline = None
+    if args.compare:
+        # проверяется до замеров, чтобы не тратить время на запуск, который не с чем сравнить
+        try:
+            baseline = load_baseline(args.compare, args.queries, args.seed)
+        except ValueError as e:
+            parser.error(f"cannot compare: {e}")
+
+    results : list[CaseResult] = []
+    for distribution in args.distributions:
+        for dimension in args.dims:
+            for size in args.sizes:
+                for bucket in args.buckets:
+                    case = run_case(distribution, dimension, size, bucket, args.queries, args.seed, not args.no_memory)
+                    print_case(case)
+                    results.append(case)
+
+    if args.output:
+        meta = {"revision": git_revision(), "python": platform.python_version(),
+                "platform": platform.platform(), "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                "seed": args.seed, "queries": args.queries}
+        with open(args.output, "w") as f:
+            json.dump({"meta": meta, "results": [asdict(c) for c in results]}, f, indent=1)
+    if baseline is not None:
+        compare(results, baseline, args.compare)
+    return
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Сверка count_in_*, aggregate_in_* с агрегатами Monoid.sum, Monoid.min и Monoid.centroid с полным перебором
+
+    python -m pytest test/test_aggregate.py
+"""
+import math
+import os
+import random
+import sys
+project_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_directory)
+from src.bi_tree import Monoid, Tree
+
+ENGINES = ["node", "arena"]
+MONOIDS = {"sum": Monoid.sum(), "min": Monoid.min(), "centroid": Monoid.centroid()}
+
+def brute(kind : str, points : dict, selected : list[int]) -> object:
+    """
+    Ожидаемый агрегат данных selected (данные - номера точек)
+    """
+    if (kind == "sum"):
+        return sum(selected)
+    if (kind == "min"):
+        return min(selected, default=math.inf)
+    if (not selected):
+        return None
+    return [sum(points[i][k] for i in selected)/len(selected) for k in range(len(points[selected[0]]))]
+
+def same(kind : str, value : object, expected : object) -> bool:
+    if (kind != "centroid"):
+        return value == expected
+    center = Monoid.center(value)
+    if (center is None) or (expected is None):
+        return center is expected
+    return all(math.isclose(a, b, rel_tol=1e-9, abs_tol=1e-9) for a, b in zip(center, expected))
+
+def check_aggregates(trees : dict, points : dict, rnd : random.Random) -> None:
+    """
+    Сравнить подсчёт и агрегаты в случайных прямоугольниках и окрестностях с полным перебором
+    trees - деревья по виду агрегата
+    """
+    for _ in range(15):
+        q = [rnd.random(), rnd.random()]
+        radius = rnd.random()*0.4
+        in_radius = [i for i, p in points.items() if math.dist(p, q) <= radius]
+        lo = [x - rnd.random()*0.4 for x in q]
+        hi = [x + rnd.random()*0.4 for x in q]
+        in_box = [i for i, p in points.items() if all(l <= x < h for x, l, h in zip(p, lo, hi))]
+        for kind, tree in trees.items():
+            assert tree.count_in_radius(q, radius) == len(in_radius)
+            assert tree.count_in_box(lo, hi) == len(in_box)
+            assert same(kind, tree.aggregate_in_radius(q, radius), brute(kind, points, in_radius))
+            assert same(kind, tree.aggregate_in_box(lo, hi), brute(kind, points, in_box))
+    return
+
+def test_aggregates_match_brute_force() -> None:
+    for engine in ENGINES:
+        for bucket in (1, 4):
+            rnd = random.Random(bucket)
+            points = {i: [rnd.random(), rnd.random()] for i in range(300)}
+            trees = {kind: Tree(2, [0.0, 0.0], [1.0, 1.0], bucket, engine=engine, aggregate=monoid)
+                     for kind, monoid in MONOIDS.items()}
+            for i, p in points.items():
+                for tree in trees.values():
+                    tree.add_content(p, i)
+            check_aggregates(trees, points, rnd)
+            for _ in range(5):
+                # перемещения и удаления сбрасывают хранящиеся агрегаты на пути к корню
+                updates = []
+                for i in rnd.sample(sorted(points), 30):
+                    points[i] = [rnd.random(), rnd.random()]
+                    updates.append((i, points[i]))
+                for tree in trees.values():
+                    tree.move_many(updates)
+                i = rnd.choice(sorted(points))
+                points[i] = [rnd.random(), rnd.random()]
+                for tree in trees.values():
+                    tree.move_data(i, points[i])
+                for i in rnd.sample(sorted(points), 25):
+                    del points[i]
+                    for tree in trees.values():
+                        tree.del_data(i)
+                check_aggregates(trees, points, rnd)
+    return
+
+def test_deep_tree_aggregates() -> None:
+    # каждая точка 2^-k отделяется от следующей своим уровнем: дерево глубже предела рекурсии
+    points = [[2.0**-k, 2.0**-k] for k in range(1, 1070)]
+    limit = sys.getrecursionlimit()
+    for engine in ENGINES:
+        # вставка в движок "node" рекурсивна, поэтому предел поднимается только на время построения
+        sys.setrecursionlimit(limit + 2*len(points))
+        try:
+            tree = Tree.from_points(points, list(range(1, len(points) + 1)), 1, [0.0, 0.0], [1.0, 1.0],
+                                    engine=engine, max_depth=2*len(points), aggregate=Monoid.sum())
+        finally:
+            sys.setrecursionlimit(limit)
+        assert tree.count_in_box([0.0, 0.0], [0.6, 0.6]) == len(points)
+        assert tree.aggregate_in_box([0.0, 0.0], [0.6, 0.6]) == sum(range(1, len(points) + 1))
+        assert tree.aggregate_in_radius([0.0, 0.0], 0.3) == sum(range(3, len(points) + 1))
+        assert tree.aggregate_in_box([0.0, 0.0], [2.0**-500, 2.0**-500]) == sum(range(501, len(points) + 1))
+    return
+
+if __name__ == "__main__":
+    test_aggregates_match_brute_force()
+    test_deep_tree_aggregates()
+    print("ok")
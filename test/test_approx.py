@@ -0,0 +1,52 @@
+"""
+Гарантия приближённого поиска ближайших ApproximateClosest.bound против полного перебора
+
+    python -m pytest test/test_approx.py
+"""
+import math
+import os
+import random
+import sys
+project_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_directory)
+from src.bi_tree import Tree
+
+ENGINES = ["node", "arena"]
+# epsilon, max_leaves, max_evaluations
+BUDGETS = [(0.0, None, None), (0.5, None, None), (2.0, None, None), (0.0, 10, None), (0.0, None, 100),
+           (0.3, 5, 50), (0.0, 1, None), (0.0, None, 3)]
+
+def test_bound_holds_against_brute_force() -> None:
+    for dim in (2, 5):
+        rnd = random.Random(dim)
+        points = [[rnd.random() for _ in range(dim)] for _ in range(2000)]
+        for engine in ENGINES:
+            tree = Tree.from_points(points, range(len(points)), 8, engine=engine)
+            for tree in (tree, tree.snapshot()):
+                for epsilon, max_leaves, max_evaluations in BUDGETS:
+                    for _ in range(30):
+                        q = [rnd.random() for _ in range(dim)]
+                        n = 5
+                        true = sorted(math.dist(q, p) for p in points)[:n]
+                        found = tree.find_data_closest_approx(q, n, epsilon, max_leaves, max_evaluations)
+                        assert found.distances == sorted(found.distances)
+                        assert all(math.isclose(math.dist(q, points[i]), d) for i, d in zip(found.data, found.distances))
+                        if (len(found.data) == n):
+                            assert found.distances[-1] <= found.bound*true[-1]*(1 + 1e-12)
+                        else:
+                            assert found.bound == math.inf
+                        if (max_leaves is None) and (max_evaluations is None):
+                            # без бюджета гарантия не хуже запрошенной, при epsilon = 0 поиск точный
+                            assert found.bound <= 1 + epsilon
+                            if (epsilon == 0.0):
+                                assert found.bound == 1.0
+                                assert all(math.isclose(a, b) for a, b in zip(found.distances, true))
+                        if (max_leaves is not None):
+                            assert found.leaves_scanned <= max_leaves
+                        if (max_evaluations is not None):
+                            assert found.distance_evaluations <= max_evaluations
+    return
+
+if __name__ == "__main__":
+    test_bound_holds_against_brute_force()
+    print("ok")
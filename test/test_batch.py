@@ -0,0 +1,87 @@
+"""
+Сверка пакетных запросов find_data_closest_many и get_data_in_radius_many с полным перебором
+
+    python -m pytest test/test_batch.py
+"""
+import math
+import os
+import random
+import sys
+import tempfile
+project_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_directory)
+import src.bi_tree as bi_tree
+from src.bi_tree import Tree
+
+ENGINES = ["node", "arena"]
+
+def random_tree(engine : str, dim : int, rnd : random.Random) -> tuple[Tree, dict]:
+    points = {i: [rnd.random() for _ in range(dim)] for i in range(300)}
+    tree = Tree(dim, [0.0]*dim, [1.0]*dim, 4, engine=engine)
+    for i, p in points.items():
+        tree.add_content(p, i)
+    return tree, points
+
+def check_batches(tree : "Tree | bi_tree.FrozenTree", points : dict, queries : list[list[float]],
+                  workers : int = 1) -> None:
+    """
+    Сравнить ответы обоих пакетных запросов с полным перебором
+    """
+    closest = tree.find_data_closest_many(queries, 4, workers=workers)
+    in_radius = tree.get_data_in_radius_many(queries, 0.15, workers=workers)
+    assert len(closest) == len(in_radius) == len(queries)
+    for q, found, near in zip(queries, closest, in_radius):
+        expected = sorted(math.dist(p, q) for p in points.values())[:4]
+        assert [math.dist(points[i], q) for i in found] == expected
+        assert sorted(near) == sorted(i for i, p in points.items() if math.dist(p, q) <= 0.15)
+    assert tree.find_data_closest_many([], 4) == []
+    assert tree.get_data_in_radius_many([], 0.15) == []
+    return
+
+def test_batches_match_brute_force() -> None:
+    for engine in ENGINES:
+        for dim in (1, 2, 3):
+            rnd = random.Random(dim)
+            tree, points = random_tree(engine, dim, rnd)
+            queries = [[rnd.uniform(-0.2, 1.2) for _ in range(dim)] for _ in range(50)]
+            check_batches(tree, points, queries)
+            check_batches(tree.snapshot(), points, queries)
+    return
+
+def test_parallel_batches_match_brute_force() -> None:
+    rnd = random.Random(7)
+    tree, points = random_tree("node", 2, rnd)
+    queries = [[rnd.random(), rnd.random()] for _ in range(40)]
+    pays_off = bi_tree.parallel_pays_off
+    # пул не окупается на таком пакете, поэтому его приходится включить принудительно
+    bi_tree.parallel_pays_off = lambda queries, workers, overhead=0: workers > 1
+    try:
+        check_batches(tree, points, queries, workers=2)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tree.bitree")
+            tree.save(path)
+            with Tree.load(path) as frozen:
+                check_batches(frozen, points, queries, workers=2)
+    finally:
+        bi_tree.parallel_pays_off = pays_off
+    assert not bi_tree.parallel_pays_off(len(queries), 2)
+    return
+
+def test_wrong_dimension_is_rejected() -> None:
+    for engine in ENGINES:
+        tree, _ = random_tree(engine, 2, random.Random(0))
+        for queries in ([[0.1, 0.2, 0.3], [0.4, 0.5, 0.6]], [[0.1], [0.2]]):
+            for query in (lambda: tree.find_data_closest_many(queries, 1),
+                          lambda: tree.get_data_in_radius_many(queries, 0.1)):
+                try:
+                    query()
+                except ValueError:
+                    continue
+                assert False, queries
+    return
+
+if __name__ == "__main__":
+    test_batches_match_brute_force()
+    test_parallel_batches_match_brute_force()
+    test_wrong_dimension_is_rejected()
+    print("ok")
@@ -0,0 +1,58 @@
+"""
+Регрессионные тесты кэша запросов Tree(..., cache_size=...)
+
+    python -m pytest test/test_cache.py
+"""
+import os
+import sys
+project_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_directory)
+from src.bi_tree import Tree
+
+ENGINES = ["node", "arena"]
+
+def widened_leaf_tree(engine : str) -> Tree:
+    """
+    Дерево, в котором подузел (0, 0) - сжатый лист с ячейкой у точки (0.1, 0.1)
+    """
+    tree = Tree(2, [0.0, 0.0], [1.0, 1.0], 2, engine=engine, cache_size=10)
+    tree.add_content((0.1, 0.1), "c1")
+    tree.add_content((0.1001, 0.1), "c2")
+    tree.add_content((0.1, 0.1001), "c3")
+    tree.add_content((0.9, 0.9), "a")
+    tree.add_content((0.9, 0.8), "b")
+    tree.del_data("c3")
+    return tree
+
+def test_widened_compressed_leaf_invalidates_radius() -> None:
+    for engine in ENGINES:
+        tree = widened_leaf_tree(engine)
+        assert tree.get_data_in_radius([0.55, 0.55], 0.2) == []
+        # точка вне сжатой ячейки расширяет лист до полной ячейки
+        tree.add_content([0.45, 0.45], "new")
+        assert tree.get_data_in_radius([0.55, 0.55], 0.2) == ["new"], engine
+    return
+
+def test_widened_compressed_leaf_invalidates_closest() -> None:
+    for engine in ENGINES:
+        tree = widened_leaf_tree(engine)
+        assert tree.find_data_closest([0.55, 0.55], 1) == ["b"]
+        tree.add_content([0.45, 0.45], "new")
+        assert tree.find_data_closest([0.55, 0.55], 1) == ["new"], engine
+    return
+
+def test_unrelated_update_keeps_entry() -> None:
+    for engine in ENGINES:
+        tree = widened_leaf_tree(engine)
+        tree.get_data_in_radius([0.9, 0.85], 0.1)
+        tree.move_data("c1", [0.1002, 0.1002])
+        tree.get_data_in_radius([0.9, 0.85], 0.1)
+        stats = tree.cache_stats()
+        assert (stats.hits, stats.invalidations) == (1, 0), engine
+    return
+
+if __name__ == "__main__":
+    test_widened_compressed_leaf_invalidates_radius()
+    test_widened_compressed_leaf_invalidates_closest()
+    test_unrelated_update_keeps_entry()
+    print("ok")
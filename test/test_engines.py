@@ -0,0 +1,202 @@
+"""
+Сверка движков "node" и "arena" с полным перебором
+
+    python -m pytest test/test_engines.py
+"""
+import math
+import os
+import random
+import sys
+project_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_directory)
+from src.bi_tree import Tree
+
+ENGINES = ["node", "arena"]
+CASES = [(dim, bucket) for dim in (1, 2, 3) for bucket in (1, 2, 4, 8)]
+
+def areas(tree : Tree) -> list[tuple[tuple[float, ...], tuple[float, ...]]]:
+    """
+    Области всех узлов дерева в сравнимом виде
+    """
+    return sorted((tuple(a.point_min()), tuple(a.point_max())) for a in tree._get_areas())
+
+def brute_radius(points : dict, q : list[float], radius : float) -> list[int]:
+    return sorted(i for i, p in points.items() if math.dist(p, q) <= radius)
+
+def brute_box(points : dict, lo : list[float], hi : list[float]) -> list[int]:
+    # верхняя граница области не входит в неё
+    return sorted(i for i, p in points.items() if all(l <= x < h for x, l, h in zip(p, lo, hi)))
+
+def brute_pairs(points : dict, radius : float) -> list[tuple[int, int]]:
+    keys = sorted(points)
+    return [(a, b) for k, a in enumerate(keys) for b in keys[k + 1:] if math.dist(points[a], points[b]) <= radius]
+
+def check_queries(trees : list[Tree], points : dict, rnd : random.Random, dim : int,
+                  low : float = 0.0, high : float = 1.0) -> None:
+    """
+    Сравнить ответы всех деревьев между собой и с полным перебором
+    low, high - границы, в которых выбираются точки запросов
+    """
+    scale = high - low
+    assert areas(trees[0]) == areas(trees[1])
+    for tree in trees:
+        assert sorted(c.data() for c in tree.iter_contents()) == sorted(points)
+    for _ in range(10):
+        q = [rnd.uniform(low, high) for _ in range(dim)]
+        radius = rnd.random()*0.3*scale
+        expected = brute_radius(points, q, radius)
+        for tree in trees:
+            assert sorted(tree.get_data_in_radius(q, radius)) == expected
+            assert tree.count_in_radius(q, radius) == len(expected)
+        lo = [x - rnd.random()*0.3*scale for x in q]
+        hi = [x + rnd.random()*0.3*scale for x in q]
+        expected = brute_box(points, lo, hi)
+        for tree in trees:
+            assert sorted(tree.get_data_in_box(lo, hi)) == expected
+            assert tree.count_in_box(lo, hi) == len(expected)
+        n = min(5, len(points))
+        expected_distances = sorted(math.dist(p, q) for p in points.values())[:n]
+        for tree in trees:
+            assert [math.dist(points[i], q) for i in tree.find_data_closest(q, n)] == expected_distances
+    expected = brute_pairs(points, 0.05*scale)
+    for tree in trees:
+        assert sorted(tuple(sorted(pair)) for pair in tree.pairs_within(0.05*scale)) == expected
+    return
+
+def test_engines_match_brute_force() -> None:
+    for dim, bucket in CASES:
+        rnd = random.Random(dim*100 + bucket)
+        points = {i: [rnd.random() for _ in range(dim)] for i in range(200)}
+        trees = [Tree(dim, [0.0]*dim, [1.0]*dim, bucket, engine=engine) for engine in ENGINES]
+        for i, p in points.items():
+            for tree in trees:
+                tree.add_content(p, i)
+        check_queries(trees, points, rnd, dim)
+        next_data = len(points)
+        for _ in range(8):
+            # пакет перемещений: мелкие сдвиги внутри листа и дальние переходы
+            updates = []
+            for i in rnd.sample(sorted(points), 40):
+                step = rnd.choice([0.01, 0.3])
+                points[i] = [(x + rnd.uniform(-step, step)) % 1.0 for x in points[i]]
+                updates.append((i, points[i]))
+            for tree in trees:
+                tree.move_many(updates)
+            i = rnd.choice(sorted(points))
+            points[i] = [rnd.random() for _ in range(dim)]
+            for tree in trees:
+                tree.move_data(i, points[i])
+            for i in rnd.sample(sorted(points), 20):
+                del points[i]
+                for tree in trees:
+                    tree.del_data(i)
+            for _ in range(20):
+                points[next_data] = [rnd.random() for _ in range(dim)]
+                for tree in trees:
+                    tree.add_content(points[next_data], next_data)
+                next_data += 1
+            check_queries(trees, points, rnd, dim)
+    return
+
+def test_growth_matches_brute_force() -> None:
+    for dim, bucket in CASES:
+        rnd = random.Random(dim*100 + bucket + 2)
+        points : dict = {}
+        trees = [Tree(dim, [0.0]*dim, [1.0]*dim, bucket, engine=engine) for engine in ENGINES]
+        # вставки и перемещения за пределы области расширяют её в разные стороны
+        for i in range(150):
+            points[i] = [rnd.uniform(-50.0, 50.0) for _ in range(dim)]
+            for tree in trees:
+                tree.add_content(points[i], i)
+        check_queries(trees, points, rnd, dim, -50.0, 50.0)
+        for _ in range(4):
+            updates = []
+            for i in rnd.sample(sorted(points), 30):
+                points[i] = [rnd.uniform(-500.0, 500.0) for _ in range(dim)]
+                updates.append((i, points[i]))
+            for tree in trees:
+                tree.move_many(updates)
+            i = rnd.choice(sorted(points))
+            points[i] = [rnd.uniform(-2000.0, 2000.0) for _ in range(dim)]
+            for tree in trees:
+                tree.move_data(i, points[i])
+            check_queries(trees, points, rnd, dim, -500.0, 500.0)
+    return
+
+def test_far_point_does_not_deepen_tree() -> None:
+    for engine in ENGINES:
+        tree = Tree(2, [0.0, 0.0], [1.0, 1.0], 2, engine=engine)
+        for i in range(10):
+            tree.add_content([i/10, 0.3], i)
+        # около тысячи удвоений области дают один сжатый уровень, а не цепочку узлов
+        tree.add_content([1e300, 0.5], "far")
+        assert len(tree._get_areas()) < 30
+        assert sorted(tree.get_data_in_radius([0.0, 0.0], 1.0)) == list(range(10))
+        assert tree.count_in_box([0.0, 0.0], [2e300, 1.0]) == 11
+        tree.move_data("far", [-1e200, 1e250])
+        tree.move_data(3, [5e300, -3e300])
+        assert len(tree._get_areas()) < 30
+        assert tree.find_data_closest([0.0, 0.3], 2) == [0, 1]
+        assert tree.get_data_in_box([-2e200, 0.0], [0.0, 2e250]) == ["far"]
+        assert tree.get_data_in_box([1e300, -1e301], [1e301, 0.0]) == [3]
+    return
+
+def test_identical_points_overflow_leaf() -> None:
+    for max_depth in (2, 5, 64):
+        for bucket in (1, 2, 4):
+            rnd = random.Random(max_depth*10 + bucket)
+            trees = [Tree(2, [0.0, 0.0], [1.0, 1.0], bucket, engine=engine, max_depth=max_depth)
+                     for engine in ENGINES]
+            points : dict = {}
+            # больше bucket совпадающих точек не разбиваются и хранятся в одном листе
+            for i in range(3*bucket + 5):
+                points[i] = [0.3, 0.3]
+                for tree in trees:
+                    tree.add_content(points[i], i)
+            for i in range(100, 130):
+                points[i] = [rnd.random(), rnd.random()]
+                for tree in trees:
+                    tree.add_content(points[i], i)
+            check_queries(trees, points, rnd, 2)
+            for _ in range(5):
+                # данные уходят из переполненного листа и возвращаются в него
+                leaving = rnd.sample([i for i, p in points.items() if p == [0.3, 0.3]], bucket + 1)
+                arriving = rnd.sample([i for i, p in points.items() if p != [0.3, 0.3]], bucket + 2)
+                updates = [(i, [rnd.random(), rnd.random()]) for i in leaving] + [(i, [0.3, 0.3]) for i in arriving]
+                for i, p in updates:
+                    points[i] = p
+                for tree in trees:
+                    tree.move_many(updates[:len(leaving)])
+                for i, p in updates[len(leaving):]:
+                    for tree in trees:
+                        tree.move_data(i, p)
+                check_queries(trees, points, rnd, 2)
+                assert all(sorted(tree.get_data_in_radius([0.3, 0.3], 0.0)) ==
+                           sorted(i for i, p in points.items() if p == [0.3, 0.3]) for tree in trees)
+            bulk = [Tree.from_points(list(points.values()), list(points), bucket, [0.0, 0.0], [1.0, 1.0],
+                                     engine=engine, max_depth=max_depth) for engine in ENGINES]
+            check_queries(bulk, points, rnd, 2)
+            for i in [i for i, p in points.items() if p == [0.3, 0.3]]:
+                del points[i]
+                for tree in trees + bulk:
+                    tree.del_data(i)
+            check_queries(trees, points, rnd, 2)
+            check_queries(bulk, points, rnd, 2)
+    return
+
+def test_bulk_loaded_engines_match_brute_force() -> None:
+    for dim, bucket in CASES:
+        rnd = random.Random(dim*100 + bucket + 1)
+        points = {i: [rnd.random() for _ in range(dim)] for i in range(200)}
+        trees = [Tree.from_points(list(points.values()), list(points), bucket, [0.0]*dim, [1.0]*dim, engine=engine)
+                 for engine in ENGINES]
+        check_queries(trees, points, rnd, dim)
+    return
+
+if __name__ == "__main__":
+    test_engines_match_brute_force()
+    test_growth_matches_brute_force()
+    test_far_point_does_not_deepen_tree()
+    test_identical_points_overflow_leaf()
+    test_bulk_loaded_engines_match_brute_force()
+    print("ok")
@@ -0,0 +1,144 @@
+"""
+Сохранение и загрузка дерева: Tree.save, Tree.load и FrozenTree
+
+    python -m pytest test/test_frozen.py
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+project_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_directory)
+from src.bi_tree import FrozenTree, Monoid, Tree
+
+ENGINES = ["node", "arena"]
+
+def random_tree(engine : str, rnd : random.Random) -> Tree:
+    tree = Tree(3, [0.0]*3, [1.0]*3, 4, engine=engine)
+    for i in range(400):
+        tree.add_content([rnd.random() for _ in range(3)], (i, f"data {i}"))
+    for i in range(0, 400, 7):
+        tree.del_data((i, f"data {i}"))
+    return tree
+
+def test_empty_tree_round_trip() -> None:
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "empty.bitree")
+        Tree(2, [0.0, 0.0], [1.0, 2.0], 4).save(path)
+        with Tree.load(path) as frozen:
+            assert len(frozen) == 0
+            assert frozen.area() == ((0.0, 0.0), (1.0, 2.0))
+            assert frozen.get_data() == []
+            assert frozen.find_data_closest([0.5, 0.5], 3) == []
+            assert frozen.get_data_in_radius([0.5, 0.5], 10.0) == []
+        tree = Tree.load(path, mmap=False)
+        assert tree.find_data_closest([0.5, 0.5], 1) == []
+        tree.add_content([0.5, 0.5], "a")
+        assert tree.find_data_closest([0.0, 0.0], 1) == ["a"]
+    return
+
+def test_queries_match_live_tree() -> None:
+    for engine in ENGINES:
+        rnd = random.Random(1)
+        tree = random_tree(engine, rnd)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tree.bitree")
+            tree.save(path)
+            for mmap in (True, False):
+                with FrozenTree.open(path, mmap) as frozen:
+                    assert len(frozen) == len(tree.get_points())
+                    assert sorted(frozen.get_data()) == sorted(c.data() for c in tree.iter_contents())
+                    for _ in range(30):
+                        q = [rnd.random() for _ in range(3)]
+                        assert frozen.find_data_closest(q, 5) == tree.find_data_closest(q, 5)
+                        assert sorted(frozen.get_data_in_radius(q, 0.2)) == sorted(tree.get_data_in_radius(q, 0.2))
+            snapshot = tree.snapshot()
+            q = [0.5, 0.5, 0.5]
+            assert snapshot.find_data_closest(q, 5) == tree.find_data_closest(q, 5)
+    return
+
+def test_rebuild_forwards_options() -> None:
+    for engine in ENGINES:
+        tree = Tree(2, [0.0, 0.0], [1.0, 1.0], 2, engine=engine)
+        for i in range(20):
+            tree.add_content([0.3, 0.3], i)
+        tree.add_content([0.4, 0.3], 20)
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tree.bitree")
+            tree.save(path)
+            rebuilt = Tree.load(path, mmap=False, engine=engine, thread_safe=True, shrink=True,
+                                max_depth=2, cache_size=4, aggregate=Monoid.sum())
+        assert str(rebuilt).startswith("2N_TREE dim=2 root=" + ("N[" if engine == "node" else "ARENA["))
+        # глубина не больше 2: корень, 4 подузла и по 4 у каждого из них
+        assert len(rebuilt._get_areas()) <= 1 + 4 + 16
+        assert sorted(rebuilt.get_data_in_radius([0.3, 0.3], 0.01)) == list(range(20))
+        rebuilt.get_data_in_radius([0.3, 0.3], 0.01)
+        assert rebuilt.cache_stats().hits == 1
+        assert rebuilt.aggregate_in_box([0.0, 0.0], [1.0, 1.0]) == sum(range(21))
+        rebuilt.del_data(20)
+        # все данные остались в одной четверти, и корнем становится её узел
+        assert rebuilt._get_areas()[0].point_max() == (0.5, 0.5)
+    return
+
+class Guarded:
+    """
+    Данные, которые нельзя сохранить через pickle
+    """
+    def __init__(self, name : str) -> None:
+        self.name = name
+        self.lock = threading.Lock()
+        return
+
+def test_snapshot_keeps_data_objects() -> None:
+    for engine in ENGINES:
+        rnd = random.Random(3)
+        tree = Tree(2, [0.0, 0.0], [1.0, 1.0], 4, engine=engine, thread_safe=True)
+        objects = [Guarded(f"object {i}") for i in range(100)]
+        for obj in objects:
+            tree.add_content([rnd.random(), rnd.random()], obj)
+        with tree.snapshot() as snapshot:
+            assert len(snapshot) == len(objects)
+            q = [0.5, 0.5]
+            closest = snapshot.find_data_closest(q, 3)
+            assert all(a is b for a, b in zip(closest, tree.find_data_closest(q, 3)))
+            assert set(map(id, snapshot.get_data_in_radius(q, 0.3))) == set(map(id, tree.get_data_in_radius(q, 0.3)))
+            assert set(map(id, snapshot.get_data())) == set(map(id, objects))
+            # изменения дерева после снимка в нём не видны
+            tree.move_data(closest[0], [0.99, 0.99])
+            tree.del_data(closest[1])
+            assert snapshot.find_data_closest(q, 3) == closest
+    return
+
+def test_close() -> None:
+    tree = random_tree("node", random.Random(2))
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "tree.bitree")
+        tree.save(path)
+        with Tree.load(path) as frozen:
+            assert len(frozen.find_data_closest([0.5]*3, 3)) == 3
+        try:
+            frozen.find_data_closest([0.5]*3, 3)
+        except ValueError:
+            pass
+        else:
+            assert False, "closed tree answered a query"
+        frozen = Tree.load(path, mmap=False)
+        assert isinstance(frozen, Tree)
+        with open(path, "r+b") as f:
+            f.write(b"NOTATREE")
+        try:
+            FrozenTree.open(path)
+        except ValueError:
+            pass
+        else:
+            assert False, "opened a file with a wrong header"
+    return
+
+if __name__ == "__main__":
+    test_empty_tree_round_trip()
+    test_queries_match_live_tree()
+    test_rebuild_forwards_options()
+    test_snapshot_keeps_data_objects()
+    test_close()
+    print("ok")
@@ -0,0 +1,56 @@
+"""
+Тесты KineticTree
+
+    python -m pytest test/test_kinetic.py
+"""
+import math
+import os
+import random
+import sys
+project_directory = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+sys.path.append(project_directory)
+from src.bi_tree import KineticTree
+
+def test_closest_without_drift_returns_n() -> None:
+    rnd = random.Random(0)
+    for _ in range(100):
+        for max_speed, horizon in ((1.0, 0.0), (0.0, 5.0)):
+            tree = KineticTree(2, [0.0, 0.0], [1.0, 1.0], 4, max_speed, horizon)
+            for i in range(50):
+                a = rnd.uniform(0.0, 2*math.pi)
+                tree.add_content([rnd.random(), rnd.random()], i, [max_speed*math.cos(a), max_speed*math.sin(a)])
+            q = [rnd.random(), rnd.random()]
+            found = tree.find_data_closest(q, 5)
+            expected = sorted(range(50), key=lambda i: math.dist(tree.position(i), q))[:5]
+            assert [math.dist(tree.position(i), q) for i in found] == \
+                   [math.dist(tree.position(i), q) for i in expected]
+    return
+
+def test_velocity_at_max_speed_is_accepted() -> None:
+    tree = KineticTree(2, [0.0, 0.0], [1.0, 1.0], 4, max_speed=1.0, horizon=1.0)
+    for i in range(1000):
+        a = 2*math.pi*i/1000
+        tree.add_content([0.5, 0.5], i, [math.cos(a), math.sin(a)])
+    return
+
+def test_rejected_velocity_leaves_tree_unchanged() -> None:
+    tree = KineticTree(2, [0.0, 0.0], [1.0, 1.0], 4, max_speed=1.0, horizon=1.0)
+    try:
+        tree.add_content([0.1, 0.1], "fast", [2.0, 0.0])
+    except AssertionError:
+        pass
+    # данные не попали в дерево, поэтому их можно добавить заново
+    tree.add_content([0.1, 0.1], "fast", [0.5, 0.0])
+    try:
+        tree.set_velocity("fast", [0.0, 3.0])
+    except AssertionError:
+        pass
+    assert tree.velocity("fast") == (0.5, 0.0)
+    assert tree.get_data_in_radius([0.1, 0.1], 0.01) == ["fast"]
+    return
+
+if __name__ == "__main__":
+    test_closest_without_drift_returns_n()
+    test_velocity_at_max_speed_is_accepted()
+    test_rejected_velocity_leaves_tree_unchanged()
+    print("ok")